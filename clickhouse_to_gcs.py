@@ -1,13 +1,27 @@
 import os
+import atexit
+import base64
 import json
 import glob
+import functools
+import hashlib
 import logging
+import logging.handlers
+import mimetypes
+import multiprocessing
+import queue
 import time
 import signal
+import sqlite3
+import stat
 import sys
+import threading
+from itertools import islice
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, as_completed, wait
+from collections import defaultdict
 from datetime import datetime
 from pathlib import Path
-from typing import List, Dict, Optional
+from typing import List, Dict, Iterable, Iterator, Optional, Union
 from dotenv import load_dotenv
 
 # Try to import Linux-specific modules
@@ -17,14 +31,29 @@ try:
     LINUX = True
 except ImportError:
     LINUX = False
+
+# Use orjson for report (de)serialization when available
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# Upload checksums use google-crc32c; its C extension keeps CRC32C off the critical path
+try:
+    import google_crc32c
+except ImportError:
+    google_crc32c = None
     
+from google.api_core.exceptions import Forbidden, GoogleAPICallError
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
+from google.cloud.storage.retry import DEFAULT_RETRY
 from google.oauth2 import service_account
+from requests.adapters import HTTPAdapter
 
 # Use psycopg2 for PostgreSQL
 import psycopg2
 import psycopg2.extras
-import psycopg2.extras
 
 # Load environment variables from .env file
 env_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), '.env')
@@ -35,9 +64,15 @@ if os.path.exists(env_path):
 # Import PostgreSQL config from config.py
 from config import (
     POSTGRES_HOST, POSTGRES_PORT, POSTGRES_USER, POSTGRES_PASSWORD, POSTGRES_DB, POSTGRES_SCHEMA, POSTGRES_VIEW,
-    GCS_BUCKET_NAME, GCS_SERVICE_ACCOUNT_KEY, WATCHED_FOLDER
+    POSTGRES_FETCH_SIZE,
+    GCS_BUCKET_NAME, GCS_SERVICE_ACCOUNT_KEY, WATCHED_FOLDER, UPLOAD_WORKERS, UPLOAD_AUTOTUNE,
+    PARALLEL_UPLOAD_THRESHOLD_MB, PARALLEL_UPLOAD_CHUNK_SIZE_MB, PARALLEL_UPLOAD_WORKERS, SYNC_SHARDS,
+    UPLOAD_CHUNK_SIZE_MB, UPLOAD_TIMEOUT, WATCH_DEBOUNCE_SECONDS
 )
 
+# Sync reports and the processed document store live next to this script
+REPORTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
+
 
 # Ensure required environment variables are set
 if not GCS_BUCKET_NAME or not GCS_SERVICE_ACCOUNT_KEY:
@@ -55,29 +90,35 @@ else:
     os.makedirs(log_dir, exist_ok=True)
     log_file = os.path.join(log_dir, 'pmen-sync.log')
     
+    # Upload threads only enqueue records; a listener thread does the file and console I/O
+    log_formatter = logging.Formatter('%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    log_handlers = [logging.FileHandler(log_file), logging.StreamHandler()]
+    for handler in log_handlers:
+        handler.setFormatter(log_formatter)
+    log_queue = queue.SimpleQueue()
+    log_listener = logging.handlers.QueueListener(log_queue, *log_handlers, respect_handler_level=True)
+    log_listener.start()
+    # main() runs repeatedly under the file watcher, so stop the listener at exit
+    atexit.register(log_listener.stop)
+    
+    queue_handler = logging.handlers.QueueHandler(log_queue)
+    queue_handler.setFormatter(logging.Formatter('%(message)s'))
     logging.basicConfig(
         level=os.getenv('LOG_LEVEL', 'INFO'),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
+        handlers=[queue_handler]
     )
     logger = logging.getLogger(__name__)
 
-logging.basicConfig(
-    level=logging.INFO,
-    format='%(asctime)s - %(levelname)s - %(message)s',
-    handlers=[
-        logging.FileHandler(log_file),
-        logging.StreamHandler()
-    ]
-)
-logger = logging.getLogger(__name__)
+if google_crc32c is None or google_crc32c.implementation != 'c':
+    logger.warning("google-crc32c C extension not available, upload checksums fall back "
+                   "to a pure-Python CRC32C and will be slow")
 
 
 def get_postgres_connection():
-    """Establish and test connection to PostgreSQL."""
+    """
+    Establish a connection to PostgreSQL. connect() only returns once the
+    server has accepted the login, so no separate test query is sent.
+    """
     try:
         logger.info("Attempting to connect to PostgreSQL...")
         conn = psycopg2.connect(
@@ -85,11 +126,13 @@ def get_postgres_connection():
             port=POSTGRES_PORT,
             user=POSTGRES_USER,
             password=POSTGRES_PASSWORD,
-            dbname=POSTGRES_DB
+            dbname=POSTGRES_DB,
+            # The file watcher holds its connection open between events
+            keepalives=1,
+            keepalives_idle=60,
+            keepalives_interval=10,
+            keepalives_count=5
         )
-        # Test connection
-        with conn.cursor() as cur:
-            cur.execute('SELECT 1')
         logger.info("PostgreSQL connection successful.")
         return conn
     except Exception as e:
@@ -104,8 +147,17 @@ def get_gcs_client():
             GCS_SERVICE_ACCOUNT_KEY
         )
         gcs_client = storage.Client(credentials=credentials)
-        # Test connection by listing buckets
-        gcs_client.list_buckets()
+        # Upload threads share the client's HTTP session; size its connection
+        # pool so every thread keeps its TLS connection between uploads
+        pool_size = max(UPLOAD_WORKERS, *AUTOTUNE_LEVELS) + PARALLEL_UPLOAD_WORKERS
+        gcs_client._http.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+        # Test connection by fetching the target bucket's metadata
+        try:
+            gcs_client.bucket(GCS_BUCKET_NAME).reload()
+        except Forbidden:
+            # Upload-only service accounts cannot read bucket metadata but can still upload
+            logger.warning(f"No permission to read metadata of bucket {GCS_BUCKET_NAME}, "
+                           f"skipping the connection check")
         logger.info("GCS connection successful.")
         return gcs_client
     except Exception as e:
@@ -121,46 +173,203 @@ def query_postgres(conn, query, params=None):
         query: SQL query string with %(param_name)s placeholders
         params: Dictionary of parameters to substitute in the query
     """
-    with conn.cursor(cursor_factory=psycopg2.extras.DictCursor) as cur:
+    with conn.cursor(cursor_factory=psycopg2.extras.RealDictCursor) as cur:
         cur.execute(query, params)
-        rows = cur.fetchall()
-        return [dict(row) for row in rows]
+        return cur.fetchall()
 
-def upload_to_gcs(gcs_client, bucket_name: str, file_path: str, destination_blob_name: str) -> bool:
-    """Upload a file to GCS bucket with detailed logging."""
-    try:
-        # Validate that the file path exists and is actually a file
-        if not os.path.exists(file_path):
-            logger.error(f"File does not exist: {file_path}")
+def iter_query_postgres(conn, query, params=None, itersize: int = POSTGRES_FETCH_SIZE) -> Iterator[dict]:
+    """
+    Execute query on a server-side cursor and yield rows as dictionaries.
+    Rows are fetched `itersize` at a time, so memory stays bounded and callers
+    can start working before the whole result has arrived.
+    """
+    with conn.cursor(name='pmen_sync_stream', cursor_factory=psycopg2.extras.RealDictCursor) as cur:
+        cur.itersize = itersize
+        cur.execute(query, params)
+        yield from cur
+
+# Resumable upload chunks must be a multiple of 256 KiB
+RESUMABLE_CHUNK_MULTIPLE = 256 * 1024
+# Files up to this size are sent in a single multipart request
+SINGLE_REQUEST_UPLOAD_MAX = 8 * 1024 * 1024
+MAX_AUTO_CHUNK_SIZE = 16 * 1024 * 1024
+UPLOAD_CONNECT_TIMEOUT = 10
+
+def resumable_chunk_size(size_bytes: int) -> Optional[int]:
+    """
+    Pick the blob chunk size for a file of `size_bytes`.
+    Small files get None (a single request); larger ones get their size
+    rounded up to a 256 KiB multiple, capped at 16 MiB, so each upload
+    buffers no more than it needs. UPLOAD_CHUNK_SIZE_MB overrides this.
+    """
+    if UPLOAD_CHUNK_SIZE_MB:
+        return UPLOAD_CHUNK_SIZE_MB * 1024 * 1024
+    if size_bytes < SINGLE_REQUEST_UPLOAD_MAX:
+        return None
+    chunk_size = min(size_bytes, MAX_AUTO_CHUNK_SIZE)
+    return -(-chunk_size // RESUMABLE_CHUNK_MULTIPLE) * RESUMABLE_CHUNK_MULTIPLE
+
+def local_file_md5(file_path: str) -> str:
+    """Return the base64-encoded MD5 of a file, as GCS reports it in md5_hash."""
+    md5 = hashlib.md5()
+    with open(file_path, 'rb') as f:
+        for block in iter(functools.partial(f.read, 1024 * 1024), b''):
+            md5.update(block)
+    return base64.b64encode(md5.digest()).decode('ascii')
+
+def list_remote_objects(bucket, prefix: str) -> Dict[str, tuple]:
+    """
+    Map every object name under `prefix` to its (size, md5_hash). Objects are
+    listed up to 1000 per request, fetching only the fields compared here.
+    """
+    blobs = bucket.list_blobs(prefix=prefix, fields='items(name,size,md5Hash),nextPageToken')
+    return {blob.name: (blob.size, blob.md5_hash) for blob in blobs}
+
+# Returned by upload_to_gcs in place of True when an identical object was already in GCS
+UPLOAD_UNCHANGED = 'unchanged'
+
+# Set once a metadata request has been refused, so the warning is logged only once
+_metadata_check_failed = False
+
+def blob_matches_local_file(bucket, blob_name: str, file_path: str, size_bytes: int,
+                            remote_objects: Optional[Dict[str, tuple]] = None) -> bool:
+    """
+    Check whether the object already in GCS has the local file's size and MD5.
+    The object is looked up in `remote_objects` from list_remote_objects when
+    given, otherwise its metadata is fetched. The file is only hashed when the
+    sizes match; objects without an MD5 (composed from parallel chunks) never match.
+    Objects whose metadata cannot be fetched, as with upload-only service
+    accounts, never match either, so the file is uploaded.
+    """
+    global _metadata_check_failed
+    if remote_objects is not None:
+        size, md5_hash = remote_objects.get(blob_name, (None, None))
+    else:
+        try:
+            existing = bucket.get_blob(blob_name)
+        except GoogleAPICallError as e:
+            if not _metadata_check_failed:
+                _metadata_check_failed = True
+                logger.warning(f"Cannot read object metadata in GCS, uploading without "
+                               f"checking for unchanged objects: {e}")
             return False
+        size, md5_hash = (existing.size, existing.md5_hash) if existing is not None else (None, None)
+    if size != size_bytes or not md5_hash:
+        return False
+    return md5_hash == local_file_md5(file_path)
+
+def upload_to_gcs(gcs_client, bucket_name: str, file_path: str, destination_blob_name: str,
+                  file_size: Optional[int] = None, bucket=None, skip_unchanged: bool = False,
+                  remote_objects: Optional[Dict[str, tuple]] = None) -> Union[bool, str]:
+    """
+    Upload a file to GCS bucket with detailed logging.
+    Callers that already know the file size in bytes can pass `file_size` to
+    skip the existence checks and the extra stat calls, and callers uploading
+    many files can pass a shared `bucket` handle. With `skip_unchanged`, an
+    existing object with the same size and MD5 is left as is and
+    UPLOAD_UNCHANGED, which is also truthy, is returned; callers that listed
+    the bucket pass the listing as `remote_objects`.
+    """
+    try:
+        if file_size is None:
+            # Validate that the file path exists and is actually a file with a single stat call
+            try:
+                file_stat = os.stat(file_path)
+            except FileNotFoundError:
+                logger.error("File does not exist: %s", file_path)
+                return False
+                
+            if not stat.S_ISREG(file_stat.st_mode):
+                logger.error("Path is not a file (possibly a directory): %s", file_path)
+                return False
             
-        if not os.path.isfile(file_path):
-            logger.error(f"Path is not a file (possibly a directory): {file_path}")
-            return False
+            file_size = file_stat.st_size
         
-        start_time = datetime.now()
-        file_size = os.path.getsize(file_path) / (1024 * 1024)  # Size in MB
+        start_time = time.monotonic()
+        size_bytes = file_size
+        file_size = file_size / (1024 * 1024)  # Size in MB
         
-        logger.info(f"Starting upload: {file_path} (Size: {file_size:.2f}MB)")
-        logger.debug(f"Destination: gs://{bucket_name}/{destination_blob_name}")
+        logger.info("Starting upload: %s (Size: %.2fMB)", file_path, file_size)
+        logger.debug("Destination: gs://%s/%s", bucket_name, destination_blob_name)
         
-        bucket = gcs_client.bucket(bucket_name)
+        if bucket is None:
+            bucket = gcs_client.bucket(bucket_name)
+        if skip_unchanged and blob_matches_local_file(bucket, destination_blob_name, file_path, size_bytes,
+                                                      remote_objects):
+            logger.info("Unchanged in GCS, skipping upload: %s", file_path)
+            return UPLOAD_UNCHANGED
         blob = bucket.blob(destination_blob_name)
         
-        # Upload the file
-        blob.upload_from_filename(file_path)
+        # Upload the file, splitting large files into concurrently uploaded chunks
+        if file_size > PARALLEL_UPLOAD_THRESHOLD_MB:
+            transfer_manager.upload_chunks_concurrently(
+                file_path, blob,
+                chunk_size=PARALLEL_UPLOAD_CHUNK_SIZE_MB * 1024 * 1024,
+                worker_type=transfer_manager.THREAD,
+                max_workers=PARALLEL_UPLOAD_WORKERS,
+                checksum='crc32c',
+                timeout=UPLOAD_TIMEOUT
+            )
+        else:
+            blob.chunk_size = resumable_chunk_size(size_bytes)
+            # Uploads overwrite the object with the same content, so retrying
+            # rate-limited (429) and transient 5xx responses with backoff is safe.
+            # The size is already known, so the library does not stat the file again.
+            with open(file_path, 'rb') as file_obj:
+                blob.upload_from_file(file_obj, size=size_bytes,
+                                      content_type=mimetypes.guess_type(file_path)[0],
+                                      checksum='crc32c',
+                                      timeout=(UPLOAD_CONNECT_TIMEOUT, UPLOAD_TIMEOUT),
+                                      retry=DEFAULT_RETRY)
         
-        duration = (datetime.now() - start_time).total_seconds()
-        logger.info(f"Upload successful: {file_path} -> gs://{bucket_name}/{destination_blob_name} "
-                  f"(Duration: {duration:.2f}s, Speed: {file_size/max(0.1, duration):.2f}MB/s)")
+        duration = time.monotonic() - start_time
+        logger.info("Upload successful: %s -> gs://%s/%s (Duration: %.2fs, Speed: %.2fMB/s)",
+                    file_path, bucket_name, destination_blob_name, duration, file_size / max(0.1, duration))
         return True
         
     except Exception as e:
-        logger.error(f"Failed to upload {file_path} to GCS: {str(e)}", exc_info=True)
+        # The traceback is only captured when debug logging is enabled
+        logger.error("Failed to upload %s to GCS: %s", file_path, e)
+        logger.debug("Upload failure details for %s", file_path, exc_info=True)
         return False
 
-def find_local_file(file_path: str, search_dir: str) -> Optional[str]:
-    """Search for a file in the documents directory using the file_path."""
+def build_file_index(search_dir: str) -> Dict[str, List[tuple]]:
+    """
+    Walk the documents directory once and map each filename to the
+    (absolute path, relative path) pairs of every file with that name,
+    shallowest path first. Relative paths use '/' separators. Unreadable
+    directories are skipped.
+    """
+    index = defaultdict(list)
+    stack = [(os.path.abspath(search_dir), '')]
+    while stack:
+        current_dir, prefix = stack.pop()
+        try:
+            with os.scandir(current_dir) as entries:
+                for entry in entries:
+                    if entry.is_dir(follow_symlinks=False):
+                        stack.append((entry.path, f"{prefix}{entry.name}/"))
+                    elif entry.is_file():
+                        index[entry.name].append((entry.path, prefix + entry.name))
+        except OSError as e:
+            logger.warning(f"Cannot scan directory {current_dir}: {e}")
+    
+    # Scan order depends on the directory stack, so order duplicates by depth
+    for entries in index.values():
+        if len(entries) > 1:
+            entries.sort(key=lambda entry: (entry[1].count('/'), entry[1]))
+    logger.info(f"Indexed {len(index)} file names under {search_dir}")
+    return dict(index)
+
+def locate_local_file(file_path: str, search_dir: str,
+                      index: Optional[Dict[str, List[tuple]]] = None) -> Optional[tuple]:
+    """
+    Search for a file in the documents directory using the file_path.
+    A file_path that resolves directly under search_dir is used as is.
+    Otherwise the filename is looked up in the index from build_file_index
+    when one is given, or searched for in the directory tree.
+    Returns an (absolute path, '/'-separated path relative to search_dir) pair.
+    """
     # Get just the filename from the path
     filename = os.path.basename(file_path)
     
@@ -168,70 +377,336 @@ def find_local_file(file_path: str, search_dir: str) -> Optional[str]:
     if not filename or not filename.strip():
         return None
     
-    # Search in the documents directory
-    search_pattern = os.path.join(search_dir, '**', filename)
-    matches = glob.glob(search_pattern, recursive=True)
+    # Fast path: the database path is relative to the documents directory
+    root = os.path.abspath(search_dir)
+    candidate = os.path.normpath(os.path.join(root, file_path.lstrip('/\\')))
+    if candidate.startswith(root + os.sep) and os.path.isfile(candidate):
+        return candidate, candidate[len(root) + 1:].replace(os.sep, '/')
     
-    # Filter to only return actual files, not directories
-    file_matches = [match for match in matches if os.path.isfile(match)]
+    if index is not None:
+        matches = index.get(filename)
+        if not matches:
+            return None
+        if len(matches) > 1:
+            logger.debug("Found %d files named %s, using %s", len(matches), filename, matches[0][0])
+        return matches[0]
     
-    if file_matches:
-        return os.path.abspath(file_matches[0])
+    # Search the documents directory tree, parent directories before subdirectories
+    stack = [root]
+    while stack:
+        subdirs = []
+        for name, path, is_dir, is_file in _list_directory(stack.pop()):
+            if is_dir:
+                subdirs.append(path)
+            elif is_file and name == filename:
+                return path, path[len(root) + 1:].replace(os.sep, '/')
+        stack.extend(reversed(subdirs))
     return None
 
+def relative_document_path(local_path: str, root_prefix: str) -> str:
+    """
+    Return local_path relative to the documents directory with '/' separators.
+    root_prefix is os.path.abspath(documents_dir) plus a trailing separator,
+    computed once per run; paths outside it fall back to os.path.relpath.
+    """
+    if local_path.startswith(root_prefix):
+        relative = local_path[len(root_prefix):]
+    else:
+        relative = os.path.relpath(local_path, root_prefix)
+    return relative.replace(os.sep, '/')
+
+def find_local_file(file_path: str, search_dir: str,
+                    index: Optional[Dict[str, List[tuple]]] = None) -> Optional[str]:
+    """Return the absolute path of the file found by locate_local_file, or None."""
+    location = locate_local_file(file_path, search_dir, index)
+    return location[0] if location else None
+
+def _list_directory(path: str) -> tuple:
+    """
+    List a directory as (name, path, is_dir, is_file) tuples. Listings are
+    read fresh on every call, so searches see files added since the last one.
+    """
+    try:
+        with os.scandir(path) as entries:
+            return tuple(
+                (entry.name, entry.path, entry.is_dir(follow_symlinks=False), entry.is_file())
+                for entry in entries
+            )
+    except OSError:
+        return ()
+
+
+# Exclusion sets larger than this are staged in a temporary table
+EXCLUDE_IDS_TEMP_TABLE_THRESHOLD = 50000
+EXCLUDED_IDS_TABLE = 'pmen_excluded_ids'
 
-def get_documents_from_postgres(conn, limit: int = 3000) -> list:
+def stage_excluded_ids(conn, exclude_ids: Iterable[str]) -> None:
+    """Load string IDs into a session-local temporary table for anti-joins."""
+    with conn.cursor() as cur:
+        cur.execute(f"CREATE TEMPORARY TABLE IF NOT EXISTS {EXCLUDED_IDS_TABLE} (id text PRIMARY KEY)")
+        cur.execute(f"TRUNCATE {EXCLUDED_IDS_TABLE}")
+        psycopg2.extras.execute_values(
+            cur, f"INSERT INTO {EXCLUDED_IDS_TABLE} (id) VALUES %s",
+            [(doc_id,) for doc_id in exclude_ids], page_size=10000
+        )
+        cur.execute(f"ANALYZE {EXCLUDED_IDS_TABLE}")
+
+def get_documents_from_postgres(conn, limit: Optional[int] = 3000, exclude_ids: Optional[set] = None,
+                                stream: bool = False, shard: Optional[tuple] = None) -> Iterable[dict]:
     """
     Retrieve documents from PostgreSQL view.
-    Returns a list of document dictionaries.
+    Documents whose id_dokumen is in `exclude_ids` (string IDs, as stored in the
+    processed cache) are filtered out by the database instead of being fetched;
+    large sets are staged with stage_excluded_ids.
+    When `shard` is a (shard_id, shard_count) pair, only documents with
+    id_dokumen % shard_count == shard_id are retrieved and `limit` is split
+    evenly across the shards. A `limit` of None retrieves every document.
+    Returns a list of document dictionaries, or a lazy iterator over them
+    when `stream` is set.
     """
+    params = {'limit': limit}
+    conditions = []
+    if exclude_ids and len(exclude_ids) > EXCLUDE_IDS_TEMP_TABLE_THRESHOLD:
+        # Large ID sets are staged in a temporary table and anti-joined
+        stage_excluded_ids(conn, exclude_ids)
+        conditions.append(f"NOT EXISTS (SELECT 1 FROM {EXCLUDED_IDS_TABLE} e WHERE e.id = id_dokumen::text)")
+    elif exclude_ids:
+        conditions.append("NOT (id_dokumen::text = ANY(%(exclude_ids)s))")
+        params['exclude_ids'] = list(exclude_ids)
+    if shard:
+        shard_id, shard_count = shard
+        conditions.append("mod(id_dokumen, %(shard_count)s) = %(shard_id)s")
+        params.update(shard_id=shard_id, shard_count=shard_count)
+        if limit is not None:
+            params['limit'] = -(-limit // shard_count)
+    where_clause = f"WHERE {' AND '.join(conditions)}\n    " if conditions else ""
+
+    # Only the columns the sync pipeline reads are fetched
     query = f"""
-    SELECT id_base, id_relasi, id_dokumen, kode_jenis_file, nomor, tahun,
-        judul, file, file_path, link
+    SELECT id_dokumen, file_path
     FROM {POSTGRES_SCHEMA}.{POSTGRES_VIEW}
-    ORDER BY id_dokumen DESC
+    {where_clause}ORDER BY id_dokumen DESC
     LIMIT %(limit)s
     """
-    logger.info(f"Retrieving up to {limit} documents from PostgreSQL view...")
-    results = query_postgres(conn, query, params={'limit': limit})
+    if params['limit'] is None:
+        logger.info("Retrieving all documents from PostgreSQL view...")
+    else:
+        logger.info(f"Retrieving up to {params['limit']} documents from PostgreSQL view...")
+    if stream:
+        return iter_query_postgres(conn, query, params=params, itersize=POSTGRES_FETCH_SIZE)
+    results = query_postgres(conn, query, params=params)
     logger.info(f"Retrieved {len(results)} documents from PostgreSQL view")
     return results
 
-def filter_unprocessed_documents(documents: list, processed_cache: set) -> tuple[list, dict]:
+def get_documents_by_file_paths(conn, relative_paths: Iterable[str]) -> list:
+    """
+    Retrieve the documents whose file_path refers to one of `relative_paths`,
+    '/'-separated paths under the documents directory, in one query. Database
+    paths that differ only in their directories, or that are bare filenames,
+    are matched on the filename, the same way locate_local_file resolves them.
+    """
+    relative_paths = sorted(set(relative_paths))
+    filenames = sorted({relative_path.rsplit('/', 1)[-1] for relative_path in relative_paths})
+    name_patterns = []
+    for filename in filenames:
+        escaped = filename.replace('\\', '\\\\').replace('%', '\\%').replace('_', '\\_')
+        name_patterns.append(f"%/{escaped}")
+    query = f"""
+    SELECT id_dokumen, file_path
+    FROM {POSTGRES_SCHEMA}.{POSTGRES_VIEW}
+    WHERE file_path = ANY(%(file_paths)s) OR file_path = ANY(%(filenames)s)
+       OR file_path LIKE ANY(%(name_patterns)s)
+    ORDER BY id_dokumen DESC
+    """
+    params = {'file_paths': relative_paths, 'filenames': filenames, 'name_patterns': name_patterns}
+    return query_postgres(conn, query, params=params)
+
+def iter_unprocessed_documents(documents: Iterable[dict], processed_cache: frozenset,
+                               stats: dict) -> Iterator[dict]:
+    """
+    Lazily yield the documents that are not in the processed cache, counting
+    total_documents, already_processed and to_process in `stats` as they pass.
+    A cache that is not a frozenset of string IDs is normalized to one.
+    The counts are added to `stats` once the documents stop being consumed.
+    """
+    if (not isinstance(processed_cache, frozenset)
+            or not all(type(doc_id) is str for doc_id in processed_cache)):
+        processed_cache = frozenset(str(doc_id) for doc_id in processed_cache)
+    # Counted in locals and bound once, since this runs for every row
+    is_processed = processed_cache.__contains__
+    _str = str
+    total = skipped = 0
+    try:
+        for doc in documents:
+            total += 1
+            # The cache stores string IDs
+            if is_processed(_str(doc.get('id_dokumen'))):
+                skipped += 1
+                continue
+            yield doc
+    finally:
+        stats['total_documents'] += total
+        stats['already_processed'] += skipped
+        stats['to_process'] += total - skipped
+
+def filter_unprocessed_documents(documents: Iterable[dict], processed_cache: frozenset) -> tuple[list, dict]:
     """
     Filter out already processed documents.
     Returns a tuple of (unprocessed_docs, stats)
     """
-    stats = {
-        'total_documents': len(documents),
-        'already_processed': 0,
-        'to_process': 0
-    }
-    
-    unprocessed = []
-    for doc in documents:
-        doc_id = doc.get('id_dokumen')
-        # Convert to string for comparison with cache (which stores string IDs)
-        doc_id_str = str(doc_id) if doc_id is not None else None
-        if doc_id_str and doc_id_str in processed_cache:
-            stats['already_processed'] += 1
-            logger.debug(f"Document {doc_id} already processed, skipping")
-        else:
-            unprocessed.append(doc)
-    
-    stats['to_process'] = len(unprocessed)
+    stats = {'total_documents': 0, 'already_processed': 0, 'to_process': 0}
+    unprocessed = list(iter_unprocessed_documents(documents, processed_cache, stats))
     logger.info(f"Filtered documents: {stats['already_processed']} already processed, "
               f"{stats['to_process']} to process")
     
     return unprocessed, stats
 
-def process_documents(documents: list, gcs_client, search_dir: str, batch_size: int = 50) -> dict:
+# Worker counts tried by autotune_upload_workers; each level uploads one full wave of files
+AUTOTUNE_LEVELS = (4, 8, 16, 32)
+
+def autotune_upload_workers(uploads: list, gcs_client, bucket, levels: tuple = AUTOTUNE_LEVELS) -> tuple[int, list]:
+    """
+    Upload a sample of files at increasing concurrency levels and return the
+    worker count with the best throughput, together with (upload, success)
+    results for every sampled upload. `uploads` holds
+    (doc_id, local_file, gcs_path) tuples; level n uploads the next n of them.
+    """
+    results = []
+    best_workers, best_rate = levels[0], -1.0
+    remaining = iter(uploads)
+    
+    for workers in levels:
+        sample = list(islice(remaining, workers))
+        if not sample:
+            break
+        
+        start_time = time.monotonic()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            outcomes = list(pool.map(
+                lambda upload: upload_to_gcs(gcs_client, GCS_BUCKET_NAME, upload[1], upload[2], bucket=bucket),
+                sample
+            ))
+        duration = max(time.monotonic() - start_time, 1e-6)
+        
+        uploaded_bytes = sum(os.path.getsize(upload[1]) for upload, ok in zip(sample, outcomes) if ok)
+        rate = uploaded_bytes / (1024 * 1024) / duration
+        logger.info(f"Autotune: {workers} workers uploaded {len(sample)} files at {rate:.2f}MB/s")
+        if rate > best_rate:
+            best_workers, best_rate = workers, rate
+        results.extend(zip(sample, outcomes))
+    
+    logger.info(f"Autotune selected {best_workers} upload workers")
+    return best_workers, results
+
+def batched(iterable: Iterable, size: int) -> Iterator[list]:
+    """Yield successive lists of up to `size` items without materializing the iterable."""
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def _resolve_uploads(documents: Iterable[dict], search_dir: str, batch_size: int,
+                     file_index: Optional[Dict[str, List[tuple]]], stats: dict) -> Iterator[tuple]:
+    """
+    Resolve documents to (doc_id, local_file, gcs_path) uploads batch by batch,
+    counting skipped and missing documents in `stats`.
+    """
+    for batch_number, batch in enumerate(batched(documents, batch_size), start=1):
+        if file_index is None:
+            file_index = build_file_index(search_dir)
+        
+        first_document = stats['total_documents'] + 1
+        stats['total_documents'] += len(batch)
+        logger.info(f"Processing batch {batch_number} "
+                  f"(Documents {first_document}-{stats['total_documents']})")
+        
+        for doc in batch:
+            doc_id = doc.get('id_dokumen')
+            file_path = doc.get('file_path', '')
+            
+            if not file_path:
+                stats['skipped_no_path'] += 1
+                logger.warning("Skipping document %s - No file path in database", doc_id)
+                continue
+            
+            logger.debug("Processing document %s with file_path: '%s'", doc_id, file_path)
+            
+            # Find the local file
+            location = locate_local_file(file_path, search_dir, file_index)
+            if not location:
+                stats['not_found'] += 1
+                logger.warning("File not found locally: %s (Document ID: %s)", file_path, doc_id)
+                continue
+            
+            # Upload to GCS with the same path structure
+            local_file, relative_path = location
+            gcs_path = f"documents/main/{relative_path}"
+            logger.debug("Processing document %s: %s -> %s", doc_id, local_file, gcs_path)
+            
+            yield doc_id, local_file, gcs_path
+
+def _record_upload(stats: dict, upload: tuple, success: bool, timestamp: str) -> None:
+    """Count an upload result in `stats`, stamping a processed file with `timestamp`."""
+    doc_id, local_file, gcs_path = upload
+    if success:
+        stats['processed'] += 1
+        stats['processed_files'].append({
+            'id_dokumen': doc_id,
+            'local_path': local_file,
+            'gcs_path': gcs_path,
+            'timestamp': timestamp
+        })
+        logger.info("Successfully processed document %s", doc_id)
+    else:
+        stats['upload_errors'] += 1
+        logger.error("Failed to upload document %s", doc_id)
+
+def _checkpoint_processed_files(stats: dict, checkpoint_dir: str, start: int) -> int:
+    """
+    Record processed files from position `start` onwards in the processed store.
+    Returns the position up to which files are recorded.
     """
-    Process a list of documents and upload them to GCS.
+    pending = stats['processed_files'][start:]
+    if pending:
+        record_processed_files(pending, checkpoint_dir)
+    return start + len(pending)
+
+def _submit_bounded(pool: ThreadPoolExecutor, fn, items: Iterable, max_in_flight: int) -> Iterator[tuple]:
+    """
+    Submit fn(item) to `pool` for each item, keeping at most `max_in_flight`
+    futures pending, and yield (item, future) pairs as they complete. `items`
+    is only read when a slot frees up.
+    """
+    pending = {}
+    for item in items:
+        if len(pending) >= max_in_flight:
+            done, _ = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield pending.pop(future), future
+        pending[pool.submit(fn, item)] = item
+    for future in as_completed(pending):
+        yield pending[future], future
+
+def process_documents(documents: Iterable[dict], gcs_client, search_dir: str, batch_size: int = 50,
+                      max_workers: int = UPLOAD_WORKERS,
+                      file_index: Optional[Dict[str, List[tuple]]] = None,
+                      autotune: bool = UPLOAD_AUTOTUNE,
+                      checkpoint_dir: Optional[str] = None) -> dict:
+    """
+    Process documents and upload them to GCS.
+    `documents` may be any iterable, including a streamed query result; it is
+    consumed `batch_size` documents at a time. Every upload is submitted to a
+    single thread pool of `max_workers`, so a slow upload never holds back the
+    next batch, and at most two uploads per worker are queued, so fetching
+    overlaps uploading without reading ahead of it. With `autotune`, the first uploads are used to measure which
+    worker count gives the best throughput and that count replaces `max_workers`.
+    Local files are looked up in `file_index`, which is built from
+    `search_dir` when not supplied. When `checkpoint_dir` is given, uploaded
+    files are recorded in its processed store every `batch_size` uploads, so
+    an interrupted run does not upload them again.
     Returns a dictionary with processing statistics.
     """
     stats = {
-        'total_documents': len(documents),
+        'total_documents': 0,
         'processed': 0,
         'skipped_no_path': 0,
         'not_found': 0,
@@ -241,51 +716,41 @@ def process_documents(documents: list, gcs_client, search_dir: str, batch_size:
         'processed_files': []
     }
     
+    checkpointed = 0
+    if checkpoint_dir:
+        os.makedirs(checkpoint_dir, exist_ok=True)
+    
     try:
-        if not documents:
-            logger.warning("No documents to process")
-            return stats
+        bucket = gcs_client.bucket(GCS_BUCKET_NAME)
+        uploads = _resolve_uploads(documents, search_dir, batch_size, file_index, stats)
         
-        # Process documents in batches
-        for i in range(0, len(documents), batch_size):
-            batch = documents[i:i + batch_size]
-            logger.info(f"Processing batch {i//batch_size + 1}/{(len(documents)-1)//batch_size + 1} "
-                      f"(Documents {i+1}-{min(i+batch_size, len(documents))})")
-            
-            for doc in batch:
-                doc_id = doc.get('id_dokumen')
-                file_path = doc.get('file_path', '')
-                
-                if not file_path:
-                    stats['skipped_no_path'] += 1
-                    logger.warning(f"Skipping document {doc_id} - No file path in database")
-                    continue
-                
-                logger.debug(f"Processing document {doc_id} with file_path: '{file_path}'")
-                
-                # Find the local file
-                local_file = find_local_file(file_path, search_dir)
-                if not local_file:
-                    stats['not_found'] += 1
-                    logger.warning(f"File not found locally: {file_path} (Document ID: {doc_id})")
-                    continue
-                
-                # Upload to GCS with the same path structure
-                gcs_path = f"documents/main/{os.path.relpath(local_file, search_dir).replace(os.path.sep, '/')}"
-                logger.debug(f"Processing document {doc_id}: {local_file} -> {gcs_path}")
-                
-                if upload_to_gcs(gcs_client, GCS_BUCKET_NAME, local_file, gcs_path):
-                    stats['processed'] += 1
-                    stats['processed_files'].append({
-                        'id_dokumen': doc_id,
-                        'local_path': local_file,
-                        'gcs_path': gcs_path,
-                        'timestamp': datetime.now().isoformat()
-                    })
-                    logger.info(f"Successfully processed document {doc_id}")
-                else:
-                    stats['upload_errors'] += 1
-                    logger.error(f"Failed to upload document {doc_id}")
+        if autotune:
+            sample = list(islice(uploads, sum(AUTOTUNE_LEVELS)))
+            max_workers, sample_results = autotune_upload_workers(sample, gcs_client, bucket, AUTOTUNE_LEVELS)
+            timestamp = datetime.now().isoformat()
+            for upload, success in sample_results:
+                _record_upload(stats, upload, success, timestamp)
+        
+        def upload(item):
+            _, local_file, gcs_path = item
+            return upload_to_gcs(gcs_client, GCS_BUCKET_NAME, local_file, gcs_path, bucket=bucket)
+        
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            # Two uploads per worker in flight keep the pool busy while the
+            # query stream is only read as fast as files are uploaded
+            completions = _submit_bounded(pool, upload, uploads, 2 * max_workers)
+            for completed, (item, future) in enumerate(completions):
+                # Uploads completing within the same batch share one timestamp
+                if completed % batch_size == 0:
+                    timestamp = datetime.now().isoformat()
+                # Results are collected on this thread only, so stats need no lock
+                _record_upload(stats, item, future.result(), timestamp)
+                if checkpoint_dir and len(stats['processed_files']) - checkpointed >= batch_size:
+                    checkpointed = _checkpoint_processed_files(stats, checkpoint_dir, checkpointed)
+        
+        # Streamed runs reach here with no documents whenever everything is synced
+        if not stats['total_documents']:
+            logger.info("No documents to process")
         
         return stats
         
@@ -293,6 +758,11 @@ def process_documents(documents: list, gcs_client, search_dir: str, batch_size:
         logger.critical(f"Critical error processing documents: {str(e)}", exc_info=True)
         raise
     finally:
+        if checkpoint_dir:
+            try:
+                _checkpoint_processed_files(stats, checkpoint_dir, checkpointed)
+            except Exception as e:
+                logger.error(f"Failed to checkpoint processed files: {e}")
         stats['end_time'] = datetime.now()
         duration = (stats['end_time'] - stats['start_time']).total_seconds()
         logger.info(f"Processing completed in {duration:.2f} seconds")
@@ -301,6 +771,21 @@ def process_documents(documents: list, gcs_client, search_dir: str, batch_size:
                   f"{stats['not_found']} not found, "
                   f"{stats['upload_errors']} upload errors")
 
+def read_json_file(path: str) -> dict:
+    """Load a JSON file, using orjson when it is installed."""
+    with open(path, 'rb') as f:
+        data = f.read()
+    return orjson.loads(data) if orjson is not None else json.loads(data)
+
+def write_json_file(path: str, data: dict) -> None:
+    """Write data as indented JSON, using orjson when it is installed."""
+    if orjson is not None:
+        with open(path, 'wb') as f:
+            f.write(orjson.dumps(data, option=orjson.OPT_INDENT_2, default=str))
+    else:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(data, f, indent=2, ensure_ascii=False, default=str)
+
 def save_processing_report(stats: dict) -> str:
     """
     Save processing statistics to a JSON file.
@@ -308,7 +793,7 @@ def save_processing_report(stats: dict) -> str:
     """
     try:
         # Create reports directory if it doesn't exist
-        reports_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
+        reports_dir = REPORTS_DIR
         os.makedirs(reports_dir, exist_ok=True)
         
         # Use fixed filename
@@ -325,23 +810,99 @@ def save_processing_report(stats: dict) -> str:
                     logger.warning(f"Failed to remove old report file {old_file}: {str(e)}")
         
         # Save the report
-        with open(filepath, 'w', encoding='utf-8') as f:
-            json.dump(stats, f, indent=2, ensure_ascii=False, default=str)
+        write_json_file(filepath, stats)
             
         logger.info(f"Saved processing report to {filepath}")
+        
+        # Keep the processed document store in step with the report
+        record_processed_files(stats.get('processed_files', []), reports_dir)
         return filepath
         
     except Exception as e:
         logger.error(f"Failed to save processing report: {str(e)}", exc_info=True)
         return ""
 
-def load_processed_cache() -> set:
-    """Loads the most recent processing report and returns a set of processed document IDs."""
+def open_processed_db(reports_dir: str) -> sqlite3.Connection:
+    """Open the SQLite store of processed documents, creating it if needed."""
+    # Shard processes write to the store concurrently, so wait for locks
+    conn = sqlite3.connect(os.path.join(reports_dir, 'processed.db'), timeout=30)
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS processed ("
+        "id_dokumen TEXT PRIMARY KEY, local_path TEXT, gcs_path TEXT, timestamp TEXT)"
+    )
+    return conn
+
+def record_processed_files(processed_files: list, reports_dir: str) -> None:
+    """Insert or update processed file records in the SQLite store."""
+    rows = [
+        (str(item['id_dokumen']), item.get('local_path'), item.get('gcs_path'), item.get('timestamp'))
+        for item in processed_files if 'id_dokumen' in item
+    ]
+    conn = open_processed_db(reports_dir)
+    try:
+        with conn:
+            conn.executemany(
+                "INSERT OR REPLACE INTO processed (id_dokumen, local_path, gcs_path, timestamp) "
+                "VALUES (?, ?, ?, ?)", rows
+            )
+    finally:
+        conn.close()
+        _read_processed_ids.cache_clear()
+
+def load_processed_records(reports_dir: str) -> Dict[str, dict]:
+    """Map each processed id_dokumen to its record in the SQLite store."""
+    if not os.path.exists(os.path.join(reports_dir, 'processed.db')):
+        return {}
+    conn = open_processed_db(reports_dir)
+    try:
+        return {
+            row[0]: {'id_dokumen': row[0], 'local_path': row[1], 'gcs_path': row[2], 'timestamp': row[3]}
+            for row in conn.execute("SELECT id_dokumen, local_path, gcs_path, timestamp FROM processed")
+        }
+    finally:
+        conn.close()
+
+def _processed_db_change_counter(db_path: str) -> int:
+    """
+    Return the file change counter from the SQLite database header, which
+    every committed write transaction increments, whichever process made it.
+    """
+    with open(db_path, 'rb') as f:
+        f.seek(24)
+        return int.from_bytes(f.read(4), 'big')
+
+@functools.lru_cache(maxsize=1)
+def _read_processed_ids(reports_dir: str, mtime_ns: int, size: int, change_counter: int) -> frozenset:
+    """
+    Read the processed IDs from the SQLite store. Keyed by the store's mtime,
+    size and change counter so repeated calls reuse the set until the store
+    is written again; record_processed_files also clears it.
+    """
+    conn = open_processed_db(reports_dir)
+    try:
+        return frozenset(row[0] for row in conn.execute("SELECT id_dokumen FROM processed"))
+    finally:
+        conn.close()
+
+def load_processed_cache() -> frozenset:
+    """
+    Returns a frozenset of processed document IDs.
+    IDs are read from the SQLite store; when it does not exist yet they are
+    loaded from the most recent processing report and used to seed it.
+    """
     try:
-        report_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
+        report_dir = REPORTS_DIR
         if not os.path.exists(report_dir):
             logger.info("Reports directory not found, starting with an empty cache.")
-            return set()
+            return frozenset()
+
+        db_path = os.path.join(report_dir, 'processed.db')
+        if os.path.exists(db_path):
+            st = os.stat(db_path)
+            processed_ids = _read_processed_ids(report_dir, st.st_mtime_ns, st.st_size,
+                                                _processed_db_change_counter(db_path))
+            logger.info(f"Loaded {len(processed_ids)} processed document IDs from the processed store.")
+            return processed_ids
 
         # Check for both filename patterns
         list_of_reports = glob.glob(os.path.join(report_dir, 'sync_report.json'))
@@ -351,40 +912,33 @@ def load_processed_cache() -> set:
             
         if not list_of_reports:
             logger.info("No previous reports found, starting with an empty cache.")
-            return set()
+            return frozenset()
 
         latest_report = max(list_of_reports, key=os.path.getctime)
         logger.info(f"Loading cache from report: {latest_report}")
 
-        with open(latest_report, 'r', encoding='utf-8') as f:
-            report_data = json.load(f)
+        report_data = read_json_file(latest_report)
         
         processed_files = report_data.get('processed_files', [])
-        processed_ids = {str(item['id_dokumen']) for item in processed_files if 'id_dokumen' in item}
+        processed_ids = frozenset(str(item['id_dokumen']) for item in processed_files if 'id_dokumen' in item)
+        record_processed_files(processed_files, report_dir)
         
         logger.info(f"Loaded {len(processed_ids)} processed document IDs into cache.")
         return processed_ids
 
     except Exception as e:
         logger.error(f"Failed to load processing cache: {e}", exc_info=True)
-        return set()
+        return frozenset()
 
 
-def main():
-    # Base directory for document search
-    base_dir = os.path.dirname(os.path.abspath(__file__))
-    documents_dir = WATCHED_FOLDER or os.path.join(base_dir, 'documents')
-
-    # Create necessary directories
-    os.makedirs(documents_dir, exist_ok=True)
-
+def sync_shard(documents_dir: str, shard_id: int = 0, shard_count: int = 1) -> Optional[dict]:
+    """
+    Sync the documents of one shard (id_dokumen % shard_count == shard_id) to GCS.
+    Opens its own PostgreSQL and GCS clients, so it can run in a worker process.
+    Returns the combined filter and processing statistics, or None if there was nothing to do.
+    """
+    shard = (shard_id, shard_count) if shard_count > 1 else None
     try:
-        logger.info("=" * 80)
-        logger.info(f"Starting GCS Synchronizer at {datetime.now().isoformat()}")
-        logger.info(f"Document directory: {documents_dir}")
-        logger.info(f"GCS Bucket: {GCS_BUCKET_NAME}")
-        logger.info("-" * 80)
-
         # Initialize clients
         logger.info("Initializing PostgreSQL client...")
         pg_conn = get_postgres_connection()
@@ -398,46 +952,93 @@ def main():
         logger.info("Loading processed documents cache...")
         processed_cache = load_processed_cache()
 
-        # Step 2: Get all documents from PostgreSQL
+        # Step 2: Stream the documents not yet processed from PostgreSQL
         logger.info("Retrieving documents from PostgreSQL view...")
-        all_documents = get_documents_from_postgres(pg_conn)
+        all_documents = get_documents_from_postgres(pg_conn, exclude_ids=processed_cache,
+                                                    shard=shard, stream=True)
 
-        if not all_documents:
-            logger.warning("No documents found in PostgreSQL view")
-            return
+        # Step 3: Filter out already processed documents as they arrive
+        filter_stats = {'total_documents': 0, 'already_processed': 0, 'to_process': 0}
+        unprocessed_docs = iter_unprocessed_documents(all_documents, processed_cache, filter_stats)
 
-        # Step 3: Filter out already processed documents
-        unprocessed_docs, filter_stats = filter_unprocessed_documents(all_documents, processed_cache)
+        # Step 4: Process only the unprocessed documents; the local file index
+        # is built when the first batch arrives
+        logger.info("Processing new documents...")
+        process_stats = process_documents(
+            unprocessed_docs, gcs_client, documents_dir,
+            checkpoint_dir=REPORTS_DIR
+        )
 
-        if not unprocessed_docs:
+        # Processed IDs are excluded by the query, so no rows means nothing is left to sync
+        if not filter_stats['to_process']:
             logger.info("No new documents to process. All documents have already been processed.")
-            return
+            return None
+        return {**filter_stats, **process_stats}
+    finally:
+        if 'pg_conn' in locals():
+            pg_conn.close()
+            logger.info("Disconnected from PostgreSQL")
 
-        # Step 4: Process only the unprocessed documents
-        logger.info(f"Processing {len(unprocessed_docs)} new documents...")
-        process_stats = process_documents(unprocessed_docs, gcs_client, documents_dir)
+def merge_shard_stats(shard_stats: List[dict]) -> dict:
+    """Merge per-shard statistics: counts are summed and lists are concatenated."""
+    merged = {}
+    for stats in shard_stats:
+        for key, value in stats.items():
+            if key not in merged:
+                merged[key] = list(value) if isinstance(value, list) else value
+            elif isinstance(value, list):
+                merged[key].extend(value)
+            elif isinstance(value, int) and not isinstance(value, bool):
+                merged[key] += value
+    return merged
 
-        # Load existing report to get previously processed files
-        try:
-            report_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
-            report_file = os.path.join(report_dir, 'sync_report.json')
-            if os.path.exists(report_file):
-                with open(report_file, 'r', encoding='utf-8') as f:
-                    existing_report = json.load(f)
-                existing_processed = existing_report.get('processed_files', [])
-            else:
-                existing_processed = []
-        except Exception as e:
-            logger.warning(f"Could not load existing report to merge processed files: {e}")
-            existing_processed = []
+def _init_shard_worker():
+    """Log directly to the handlers in shard worker processes, which exit without draining the log queue."""
+    if 'log_listener' in globals():
+        log_listener.stop()
+        root_logger = logging.getLogger()
+        root_logger.removeHandler(queue_handler)
+        for handler in log_handlers:
+            root_logger.addHandler(handler)
 
-        # Combine statistics and merge processed files
+def main():
+    # Base directory for document search
+    base_dir = os.path.dirname(os.path.abspath(__file__))
+    documents_dir = WATCHED_FOLDER or os.path.join(base_dir, 'documents')
+
+    # Create necessary directories
+    os.makedirs(documents_dir, exist_ok=True)
+
+    try:
+        logger.info("=" * 80)
+        logger.info(f"Starting GCS Synchronizer at {datetime.now().isoformat()}")
+        logger.info(f"Document directory: {documents_dir}")
+        logger.info(f"GCS Bucket: {GCS_BUCKET_NAME}")
+        logger.info("-" * 80)
+
+        if SYNC_SHARDS > 1:
+            # Each shard runs in its own process with its own clients; spawn
+            # gives every worker a fresh interpreter instead of forked client state
+            logger.info(f"Syncing in {SYNC_SHARDS} shard processes...")
+            context = multiprocessing.get_context('spawn')
+            with context.Pool(SYNC_SHARDS, initializer=_init_shard_worker) as pool:
+                shard_stats = pool.starmap(
+                    sync_shard, [(documents_dir, shard_id, SYNC_SHARDS) for shard_id in range(SYNC_SHARDS)]
+                )
+        else:
+            shard_stats = [sync_shard(documents_dir)]
+
+        shard_stats = [stats for stats in shard_stats if stats]
+        if not shard_stats:
+            return
+        process_stats = merge_shard_stats(shard_stats)
+
+        # The report covers this run; the processed store keeps the full history
         stats = {
-            **filter_stats,
             **process_stats,
             'start_time': datetime.now(),
             'end_time': None,
-            'processed_files': existing_processed + process_stats.get('processed_files', [])
+            'processed_files': process_stats.get('processed_files', [])
         }
 
         # Save processing report
@@ -451,38 +1052,126 @@ def main():
         logger.critical(f"Fatal error in main process: {str(e)}", exc_info=True)
         raise
     finally:
-        if 'pg_conn' in locals():
-            pg_conn.close()
-            logger.info("Disconnected from PostgreSQL")
-
         logger.info("=" * 80)
 
+def sync_paths(pg_conn, gcs_client, pathnames: Iterable[str], documents_dir: str,
+               file_index: Dict[str, List[tuple]]) -> dict:
+    """
+    Sync the documents stored at the local files `pathnames` to GCS, using
+    already open clients. The files are added to `file_index`, only their
+    rows are queried, and uploads are recorded in the processed store.
+    Returns the processing statistics.
+    """
+    root_prefix = os.path.join(os.path.abspath(documents_dir), '')
+    relative_paths = []
+    for pathname in pathnames:
+        path = os.path.abspath(pathname)
+        entry = (path, relative_document_path(path, root_prefix))
+        entries = file_index.setdefault(os.path.basename(path), [])
+        if entry not in entries:
+            entries.append(entry)
+        relative_paths.append(entry[1])
+    
+    documents = get_documents_by_file_paths(pg_conn, relative_paths)
+    logger.info(f"{len(documents)} documents refer to {len(relative_paths)} changed files")
+    return process_documents(
+        documents, gcs_client, documents_dir, file_index=file_index, autotune=False,
+        checkpoint_dir=REPORTS_DIR
+    )
+
+# Flushes a changed file is retried in before it is left for the next full sync
+WATCH_MAX_FLUSH_ATTEMPTS = 5
+
 class PMENFileWatcher:
-    def __init__(self, watch_dir):
+    def __init__(self, watch_dir, pg_conn=None, gcs_client=None, file_index=None):
         self.watch_dir = watch_dir
         self.wm = pyinotify.WatchManager()
-        self.mask = pyinotify.IN_CREATE | pyinotify.IN_MODIFY
+        # Files are synced once the writer closes them, not on every write
+        self.mask = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO
+        # Clients and the file index live as long as the watcher, so a burst
+        # of events costs one targeted query and its uploads
+        self.pg_conn = pg_conn
+        if pg_conn is not None:
+            self._use_autocommit(pg_conn)
+        self.gcs_client = gcs_client
+        self.file_index = file_index
+        # Changed files collected by the notifier thread until the next flush
+        self.pending = set()
+        self.pending_lock = threading.Lock()
+        # Failed flushes per changed file, for files requeued after an error
+        self.failed_attempts = {}
         
     def process_event(self, event):
         if not event.dir and event.pathname.endswith(('.pdf', '.PDF')):
-            logger.info(f"Detected change in file: {event.pathname}")
-            # Trigger document processing
-            main()
+            logger.debug("Detected change in file: %s", event.pathname)
+            with self.pending_lock:
+                self.pending.add(event.pathname)
+    
+    def flush(self):
+        """Sync the files changed since the last flush in one batch."""
+        with self.pending_lock:
+            if not self.pending:
+                return
+            batch, self.pending = self.pending, set()
+        logger.info(f"Syncing {len(batch)} changed files")
+        try:
+            if self.file_index is None:
+                self.file_index = build_file_index(self.watch_dir)
+            if self.pg_conn is None or self.pg_conn.closed:
+                self.pg_conn = self._use_autocommit(get_postgres_connection())
+            if self.gcs_client is None:
+                self.gcs_client = get_gcs_client()
+            sync_paths(self.pg_conn, self.gcs_client, batch, self.watch_dir, self.file_index)
+        except psycopg2.Error as e:
+            logger.error(f"Failed to sync {len(batch)} changed files: {e}", exc_info=True)
+            # The connection may be broken or left in an aborted transaction;
+            # the next flush opens a new one
+            if self.pg_conn is not None:
+                self.pg_conn.close()
+                self.pg_conn = None
+            self._requeue(batch)
+        except Exception as e:
+            logger.error(f"Failed to sync {len(batch)} changed files: {e}", exc_info=True)
+            self._requeue(batch)
+        else:
+            for pathname in batch:
+                self.failed_attempts.pop(pathname, None)
+
+    def _requeue(self, batch):
+        """Return a failed batch to the pending files, dropping files that failed too often."""
+        retry = set()
+        for pathname in batch:
+            attempts = self.failed_attempts.get(pathname, 0) + 1
+            if attempts < WATCH_MAX_FLUSH_ATTEMPTS:
+                self.failed_attempts[pathname] = attempts
+                retry.add(pathname)
+            else:
+                self.failed_attempts.pop(pathname, None)
+                logger.error(f"Giving up on {pathname} after {attempts} failed syncs")
+        with self.pending_lock:
+            self.pending |= retry
+
+    @staticmethod
+    def _use_autocommit(pg_conn):
+        """Put the long-lived connection in autocommit, so it never sits idle in a transaction."""
+        pg_conn.autocommit = True
+        return pg_conn
     
     def watch(self):
         logger.info(f"Starting file watcher on directory: {self.watch_dir}")
         handler = lambda event: self.process_event(event)
-        self.notifier = pyinotify.ThreadedNotifier(self.wm, pyinotify.ProcessEvent())
+        self.notifier = pyinotify.ThreadedNotifier(self.wm, handler)
         self.wm.add_watch(self.watch_dir, self.mask, rec=True, auto_add=True)
         self.notifier.start()
         
-        # Keep the main thread alive
         signal.signal(signal.SIGTERM, self.shutdown)
         signal.signal(signal.SIGINT, self.shutdown)
         
+        # The main thread syncs the changes collected over each debounce interval
         try:
             while True:
-                time.sleep(1)
+                time.sleep(WATCH_DEBOUNCE_SECONDS)
+                self.flush()
         except (KeyboardInterrupt, SystemExit):
             self.shutdown()
     
@@ -490,6 +1179,8 @@ class PMENFileWatcher:
         logger.info("Shutting down file watcher...")
         if hasattr(self, 'notifier'):
             self.notifier.stop()
+        if self.pg_conn is not None:
+            self.pg_conn.close()
         sys.exit(0)
 
 def run_as_service():
@@ -501,20 +1192,83 @@ def run_as_service():
     # Initial run
     main()
     
-    # Start file watcher
-    watcher = PMENFileWatcher(WATCHED_FOLDER)
+    # Start file watcher with clients that stay open between events
+    watcher = PMENFileWatcher(WATCHED_FOLDER, get_postgres_connection(), get_gcs_client(),
+                              build_file_index(WATCHED_FOLDER))
     watcher.watch()
 
-def resync_documents(ch_client, gcs_client, documents_dir: str) -> dict:
+# Resyncs with at least this many candidates list the documents prefix once
+# instead of fetching the metadata of every object
+RESYNC_LISTING_THRESHOLD = 1000
+
+def _upload_resync_documents(uploads: List[tuple], gcs_client, stats: dict,
+                             max_workers: int = UPLOAD_WORKERS) -> None:
     """
-    Resync by comparing ClickHouse data with local documents one by one.
-    Skips documents already recorded in sync_report.json.
+    Upload (doc_id, local_file, gcs_path) resync candidates concurrently,
+    counting the results in `stats`. Objects already identical in GCS are
+    not uploaded again and are counted as unchanged.
+    """
+    if not uploads:
+        return
+    logger.info(f"Uploading {len(uploads)} documents with {max_workers} workers...")
+    bucket = gcs_client.bucket(GCS_BUCKET_NAME)
+    remote_objects = None
+    skip_unchanged = True
+    if len(uploads) >= RESYNC_LISTING_THRESHOLD:
+        try:
+            remote_objects = list_remote_objects(bucket, 'documents/main/')
+            logger.info(f"Listed {len(remote_objects)} objects already in GCS")
+        except Forbidden as e:
+            # An account that may not list objects may not read their metadata either
+            logger.warning(f"No permission to list objects in GCS, uploading without "
+                           f"checking for unchanged objects: {e}")
+            skip_unchanged = False
+        except Exception as e:
+            logger.warning(f"Failed to list objects in GCS, checking them one by one: {e}")
+    with ThreadPoolExecutor(max_workers=max_workers) as executor:
+        futures = {
+            executor.submit(upload_to_gcs, gcs_client, GCS_BUCKET_NAME, local_file, gcs_path,
+                            bucket=bucket, skip_unchanged=skip_unchanged,
+                            remote_objects=remote_objects): (doc_id, local_file, gcs_path)
+            for doc_id, local_file, gcs_path in uploads
+        }
+        for completed, future in enumerate(as_completed(futures)):
+            # Uploads completing within the same wave of workers share one timestamp
+            if completed % max_workers == 0:
+                timestamp = datetime.now().isoformat()
+            # Results are collected on this thread only, so stats need no lock
+            doc_id, local_file, gcs_path = futures[future]
+            result = future.result()
+            if result:
+                # Identical objects are still recorded as processed, but not as synced now
+                if result == UPLOAD_UNCHANGED:
+                    stats['unchanged'] += 1
+                else:
+                    stats['newly_synced'] += 1
+                stats['processed_files'].append({
+                    'id_dokumen': doc_id,
+                    'local_path': local_file,
+                    'gcs_path': gcs_path,
+                    'timestamp': timestamp
+                })
+                logger.info("  [SUCCESS] Successfully synced document %s", doc_id)
+            else:
+                stats['sync_errors'] += 1
+                logger.error("  [ERROR] Failed to sync document %s", doc_id)
+
+def resync_documents(pg_conn, gcs_client, documents_dir: str,
+                     file_index: Optional[Dict[str, List[tuple]]] = None) -> dict:
+    """
+    Resync by comparing PostgreSQL data with local documents one by one.
+    Skips documents already in the processed store. Local files are
+    looked up in `file_index`, which is built when not supplied.
     """
     stats = {
         'total_documents': 0,
         'already_synced': 0,
         'file_not_found': 0,
         'newly_synced': 0,
+        'unchanged': 0,
         'sync_errors': 0,
         'start_time': datetime.now(),
         'end_time': None,
@@ -524,70 +1278,62 @@ def resync_documents(ch_client, gcs_client, documents_dir: str) -> dict:
     try:
         logger.info("Starting resync operation...")
         
-        # Load processed cache from sync_report.json
+        # Load processed cache from the processed store
         processed_cache = load_processed_cache()
         logger.info(f"Loaded {len(processed_cache)} already processed documents from cache")
         
-        # Get all documents from ClickHouse
-        logger.info("Retrieving all documents from ClickHouse...")
-        all_documents = get_documents_from_clickhouse(ch_client)
+        # Get all documents from PostgreSQL
+        logger.info("Retrieving all documents from PostgreSQL...")
+        all_documents = get_documents_from_postgres(pg_conn, limit=None)
         stats['total_documents'] = len(all_documents)
         
         if not all_documents:
-            logger.warning("No documents found in ClickHouse")
+            logger.warning("No documents found in PostgreSQL view")
             return stats
         
-        logger.info(f"Found {len(all_documents)} documents in ClickHouse")
+        logger.info(f"Found {len(all_documents)} documents in PostgreSQL view")
+        if file_index is None:
+            file_index = build_file_index(documents_dir)
         logger.info("Starting one-by-one comparison...")
         
-        # Process each document one by one
+        # Check each document one by one and queue the ones to upload
+        uploads = []
         for i, doc in enumerate(all_documents, 1):
             doc_id = doc.get('id_dokumen')
             file_path = doc.get('file_path', '').strip()
             
-            logger.info(f"[{i}/{len(all_documents)}] Processing document {doc_id}")
+            logger.debug("[%s/%s] Processing document %s", i, len(all_documents), doc_id)
             
             # Skip if already in sync report
             if str(doc_id) in processed_cache:
                 stats['already_synced'] += 1
-                logger.info(f"  [SKIP] Document {doc_id} already synced, skipping")
+                logger.debug("  [SKIP] Document %s already synced, skipping", doc_id)
                 continue
             
             # Skip if no file path
             if not file_path:
-                logger.warning(f"  [WARN] Document {doc_id} has no file_path, skipping")
+                logger.warning("  [WARN] Document %s has no file_path, skipping", doc_id)
                 continue
             
-            logger.info(f"  [SEARCH] Looking for file: '{file_path}'")
+            logger.debug("  [SEARCH] Looking for file: '%s'", file_path)
             
             # Find the local file
-            local_file = find_local_file(file_path, documents_dir)
-            if not local_file:
+            location = locate_local_file(file_path, documents_dir, file_index)
+            if not location:
                 stats['file_not_found'] += 1
-                logger.warning(f"  [NOT FOUND] File not found locally: '{file_path}'")
+                logger.warning("  [NOT FOUND] File not found locally: '%s'", file_path)
                 continue
             
-            logger.info(f"  [FOUND] Found local file: {local_file}")
-            
-            # Upload to GCS
-            gcs_path = f"documents/main/{os.path.relpath(local_file, documents_dir).replace(os.path.sep, '/')}"
-            logger.info(f"  [UPLOAD] Uploading to GCS: {gcs_path}")
+            local_file, relative_path = location
+            logger.debug("  [FOUND] Found local file: %s", local_file)
             
-            if upload_to_gcs(gcs_client, GCS_BUCKET_NAME, local_file, gcs_path):
-                stats['newly_synced'] += 1
-                stats['processed_files'].append({
-                    'id_dokumen': doc_id,
-                    'local_path': local_file,
-                    'gcs_path': gcs_path,
-                    'timestamp': datetime.now().isoformat()
-                })
-                logger.info(f"  [SUCCESS] Successfully synced document {doc_id}")
-            else:
-                stats['sync_errors'] += 1
-                logger.error(f"  [ERROR] Failed to sync document {doc_id}")
-            
-            # Add a small delay to avoid overwhelming the system
-            time.sleep(0.1)
+            # Queue the upload to GCS
+            gcs_path = f"documents/main/{relative_path}"
+            logger.debug("  [UPLOAD] Queued upload to GCS: %s", gcs_path)
+            uploads.append((doc_id, local_file, gcs_path))
+        
+        # Upload the queued documents concurrently
+        _upload_resync_documents(uploads, gcs_client, stats)
         
         return stats
         
@@ -599,6 +1345,7 @@ def resync_documents(ch_client, gcs_client, documents_dir: str) -> dict:
         duration = (stats['end_time'] - stats['start_time']).total_seconds()
         logger.info(f"Resync completed in {duration:.2f} seconds")
         logger.info(f"Resync Summary: {stats['newly_synced']} newly synced, "
+                  f"{stats['unchanged']} unchanged in GCS, "
                   f"{stats['already_synced']} already synced, "
                   f"{stats['file_not_found']} files not found, "
                   f"{stats['sync_errors']} sync errors")
@@ -620,39 +1367,25 @@ def main_resync():
         logger.info("-" * 80)
         
         # Initialize clients
-        logger.info("Initializing ClickHouse client...")
-        ch_client = get_clickhouse_connection()
-        logger.info("Connected to ClickHouse")
+        logger.info("Initializing PostgreSQL client...")
+        pg_conn = get_postgres_connection()
+        logger.info("Connected to PostgreSQL")
         
         logger.info("Initializing GCS client...")
         gcs_client = get_gcs_client()
         logger.info("Initialized GCS client")
         
-        # Perform enhanced resync operation with file validation
-        resync_stats = resync_with_file_validation(ch_client, gcs_client, documents_dir)
-        
-        # Load existing report to merge with new results
-        try:
-            report_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
-            report_file = os.path.join(report_dir, 'sync_report.json')
-            if os.path.exists(report_file):
-                with open(report_file, 'r', encoding='utf-8') as f:
-                    existing_report = json.load(f)
-                existing_processed = existing_report.get('processed_files', [])
-            else:
-                existing_processed = []
-        except Exception as e:
-            logger.warning(f"Could not load existing report: {e}")
-            existing_processed = []
+        # Index the local documents once instead of searching per document
+        logger.info("Indexing local documents...")
+        file_index = build_file_index(documents_dir)
         
-        # Merge the newly processed files with existing ones
-        all_processed_files = existing_processed + resync_stats.get('processed_files', [])
+        # Perform enhanced resync operation with file validation
+        resync_stats = resync_with_file_validation(pg_conn, gcs_client, documents_dir, file_index)
         
-        # Create final stats for the report
+        # The report covers this run; the processed store keeps the full history
         final_stats = {
             **resync_stats,
-            'processed_files': all_processed_files,
-            'total_processed_files': len(all_processed_files)
+            'total_processed_files': len(resync_stats.get('processed_files', []))
         }
         
         # Save updated processing report
@@ -666,16 +1399,18 @@ def main_resync():
         logger.critical(f"Fatal error in resync process: {str(e)}", exc_info=True)
         raise
     finally:
-        if 'ch_client' in locals():
-            ch_client.disconnect()
-            logger.info("Disconnected from ClickHouse")
+        if 'pg_conn' in locals():
+            pg_conn.close()
+            logger.info("Disconnected from PostgreSQL")
         
         logger.info("=" * 80)
 
-def resync_with_file_validation(ch_client, gcs_client, documents_dir: str) -> dict:
+def resync_with_file_validation(pg_conn, gcs_client, documents_dir: str,
+                                file_index: Optional[Dict[str, List[tuple]]] = None) -> dict:
     """
-    Enhanced resync that validates file paths between ClickHouse and sync report.
-    Updates records when file paths have changed in the database.
+    Enhanced resync that validates file paths between PostgreSQL and the processed store.
+    Updates records when file paths have changed in the database. Local files
+    are looked up in `file_index`, which is built when not supplied.
     """
     stats = {
         'total_documents': 0,
@@ -683,6 +1418,7 @@ def resync_with_file_validation(ch_client, gcs_client, documents_dir: str) -> di
         'file_path_changed': 0,
         'file_not_found': 0,
         'newly_synced': 0,
+        'unchanged': 0,
         'sync_errors': 0,
         'start_time': datetime.now(),
         'end_time': None,
@@ -692,46 +1428,40 @@ def resync_with_file_validation(ch_client, gcs_client, documents_dir: str) -> di
     try:
         logger.info("Starting enhanced resync with file validation...")
         
-        # Load processed cache from sync_report.json
+        # Load processed cache from the processed store
         processed_cache = load_processed_cache()
         logger.info(f"Loaded {len(processed_cache)} already processed documents from cache")
         
-        # Load the full sync report to check file paths
-        report_dir = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'reports')
-        report_file = os.path.join(report_dir, 'sync_report.json')
-        existing_records = {}
-        
-        if os.path.exists(report_file):
-            with open(report_file, 'r', encoding='utf-8') as f:
-                existing_report = json.load(f)
-            # Create a map of id_dokumen -> file info from existing report
-            for item in existing_report.get('processed_files', []):
-                doc_id = str(item.get('id_dokumen', ''))
-                if doc_id:
-                    existing_records[doc_id] = item
-        
-        # Get all documents from ClickHouse
-        logger.info("Retrieving all documents from ClickHouse...")
-        all_documents = get_documents_from_clickhouse(ch_client)
+        # Load the processed records to check file paths
+        report_dir = REPORTS_DIR
+        existing_records = load_processed_records(report_dir)
+        
+        # Get all documents from PostgreSQL
+        logger.info("Retrieving all documents from PostgreSQL...")
+        all_documents = get_documents_from_postgres(pg_conn, limit=None)
         stats['total_documents'] = len(all_documents)
         
         if not all_documents:
-            logger.warning("No documents found in ClickHouse")
+            logger.warning("No documents found in PostgreSQL view")
             return stats
         
-        logger.info(f"Found {len(all_documents)} documents in ClickHouse")
+        logger.info(f"Found {len(all_documents)} documents in PostgreSQL view")
+        if file_index is None:
+            file_index = build_file_index(documents_dir)
         logger.info("Starting enhanced one-by-one comparison...")
+        root_prefix = os.path.join(os.path.abspath(documents_dir), '')
         
-        # Process each document one by one
+        # Check each document one by one and queue the ones to upload
+        uploads = []
         for i, doc in enumerate(all_documents, 1):
             doc_id = doc.get('id_dokumen')
             file_path = doc.get('file_path', '').strip()
             
-            logger.info(f"[{i}/{len(all_documents)}] Processing document {doc_id}")
+            logger.debug("[%s/%s] Processing document %s", i, len(all_documents), doc_id)
             
             # Skip if no file path
             if not file_path:
-                logger.warning(f"  [WARN] Document {doc_id} has no file_path, skipping")
+                logger.warning("  [WARN] Document %s has no file_path, skipping", doc_id)
                 continue
             
             # Check if this document is in our cache
@@ -744,62 +1474,47 @@ def resync_with_file_validation(ch_client, gcs_client, documents_dir: str) -> di
                     if existing_local_path:
                         # Convert to relative path for comparison
                         try:
-                            existing_rel_path = os.path.relpath(existing_local_path, documents_dir).replace(os.path.sep, '/')
-                        except:
+                            existing_rel_path = relative_document_path(existing_local_path, root_prefix)
+                        except ValueError:
                             existing_rel_path = ""
                         
                         # Compare with current file_path
                         if existing_rel_path != file_path:
                             stats['file_path_changed'] += 1
-                            logger.warning(f"  [CHANGED] File path changed for document {doc_id}:")
-                            logger.warning(f"    Old: {existing_rel_path}")
-                            logger.warning(f"    New: {file_path}")
-                            # Remove from cache so it gets reprocessed
-                            processed_cache.discard(str(doc_id))
+                            logger.warning("  [CHANGED] File path changed for document %s:", doc_id)
+                            logger.warning("    Old: %s", existing_rel_path)
+                            logger.warning("    New: %s", file_path)
                         else:
                             stats['already_synced'] += 1
-                            logger.info(f"  [SKIP] Document {doc_id} already synced, skipping")
+                            logger.debug("  [SKIP] Document %s already synced, skipping", doc_id)
                             continue
                     else:
                         # No local path in existing record, treat as needs reprocessing
-                        logger.warning(f"  [NO PATH] Existing record for {doc_id} has no local_path, reprocessing")
-                        processed_cache.discard(str(doc_id))
+                        logger.warning("  [NO PATH] Existing record for %s has no local_path, reprocessing", doc_id)
                 else:
                     # In cache but no record found, treat as needs reprocessing
-                    logger.warning(f"  [NO RECORD] Document {doc_id} in cache but no record found, reprocessing")
-                    processed_cache.discard(str(doc_id))
+                    logger.warning("  [NO RECORD] Document %s in cache but no record found, reprocessing", doc_id)
             
             # If we reach here, document needs to be processed
-            logger.info(f"  [SEARCH] Looking for file: '{file_path}'")
+            logger.debug("  [SEARCH] Looking for file: '%s'", file_path)
             
             # Find the local file
-            local_file = find_local_file(file_path, documents_dir)
-            if not local_file:
+            location = locate_local_file(file_path, documents_dir, file_index)
+            if not location:
                 stats['file_not_found'] += 1
-                logger.warning(f"  [NOT FOUND] File not found locally: '{file_path}'")
+                logger.warning("  [NOT FOUND] File not found locally: '%s'", file_path)
                 continue
             
-            logger.info(f"  [FOUND] Found local file: {local_file}")
-            
-            # Upload to GCS
-            gcs_path = f"documents/main/{os.path.relpath(local_file, documents_dir).replace(os.path.sep, '/')}"
-            logger.info(f"  [UPLOAD] Uploading to GCS: {gcs_path}")
-            
-            if upload_to_gcs(gcs_client, GCS_BUCKET_NAME, local_file, gcs_path):
-                stats['newly_synced'] += 1
-                stats['processed_files'].append({
-                    'id_dokumen': doc_id,
-                    'local_path': local_file,
-                    'gcs_path': gcs_path,
-                    'timestamp': datetime.now().isoformat()
-                })
-                logger.info(f"  [SUCCESS] Successfully synced document {doc_id}")
-            else:
-                stats['sync_errors'] += 1
-                logger.error(f"  [ERROR] Failed to sync document {doc_id}")
+            local_file, relative_path = location
+            logger.debug("  [FOUND] Found local file: %s", local_file)
             
-            # Add a small delay to avoid overwhelming the system
-            time.sleep(0.1)
+            # Queue the upload to GCS
+            gcs_path = f"documents/main/{relative_path}"
+            logger.debug("  [UPLOAD] Queued upload to GCS: %s", gcs_path)
+            uploads.append((doc_id, local_file, gcs_path))
+        
+        # Upload the queued documents concurrently
+        _upload_resync_documents(uploads, gcs_client, stats)
         
         return stats
         
@@ -811,6 +1526,7 @@ def resync_with_file_validation(ch_client, gcs_client, documents_dir: str) -> di
         duration = (stats['end_time'] - stats['start_time']).total_seconds()
         logger.info(f"Enhanced resync completed in {duration:.2f} seconds")
         logger.info(f"Enhanced Resync Summary: {stats['newly_synced']} newly synced, "
+                  f"{stats['unchanged']} unchanged in GCS, "
                   f"{stats['already_synced']} already synced, "
                   f"{stats['file_path_changed']} file paths changed, "
                   f"{stats['file_not_found']} files not found, "
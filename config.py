@@ -3,8 +3,11 @@ import os
 from pathlib import Path
 from dotenv import load_dotenv
 
+# Directory holding this file; relative paths in the settings are resolved against it
+BASE_DIR = Path(__file__).resolve().parent
+
 # Load environment variables from .env file
-env_path = Path(__file__).parent / '.env'
+env_path = BASE_DIR / '.env'
 load_dotenv(dotenv_path=env_path)
 
 def get_env_variable(name: str, default: str = None) -> str:
@@ -18,7 +21,7 @@ def get_absolute_path(path: str) -> str:
     """Convert relative path to absolute path relative to config file."""
     if not path:
         return path
-    return str((Path(__file__).parent / path).resolve())
+    return str((BASE_DIR / path).resolve())
 
 # Google Cloud Storage (GCS) Configuration
 GCS_BUCKET_NAME = get_env_variable('GCS_BUCKET_NAME')
@@ -35,11 +38,32 @@ POSTGRES_PASSWORD = get_env_variable('POSTGRES_PASSWORD', 'AppPm3n2025')
 POSTGRES_DB = get_env_variable('POSTGRES_DB', 'pmen')
 POSTGRES_SCHEMA = get_env_variable('POSTGRES_SCHEMA', 'transaksi')
 POSTGRES_VIEW = get_env_variable('POSTGRES_VIEW', 'v_dokumen')
+# Rows fetched per round trip when streaming documents
+POSTGRES_FETCH_SIZE = int(get_env_variable('POSTGRES_FETCH_SIZE', '2000'))
+
+# Upload Configuration
+UPLOAD_WORKERS = int(get_env_variable('UPLOAD_WORKERS', '16'))
+# Measure throughput on the first uploads of a run and pick the best worker count
+UPLOAD_AUTOTUNE = get_env_variable('UPLOAD_AUTOTUNE', 'false').lower() == 'true'
+# Files larger than this are uploaded in parallel chunks
+PARALLEL_UPLOAD_THRESHOLD_MB = int(get_env_variable('PARALLEL_UPLOAD_THRESHOLD_MB', '32'))
+PARALLEL_UPLOAD_CHUNK_SIZE_MB = int(get_env_variable('PARALLEL_UPLOAD_CHUNK_SIZE_MB', '16'))
+PARALLEL_UPLOAD_WORKERS = int(get_env_variable('PARALLEL_UPLOAD_WORKERS', '8'))
+# Chunk size for resumable uploads of smaller files; 0 sizes chunks per file
+UPLOAD_CHUNK_SIZE_MB = int(get_env_variable('UPLOAD_CHUNK_SIZE_MB', '0'))
+# Seconds to wait for the server on each upload request
+UPLOAD_TIMEOUT = int(get_env_variable('UPLOAD_TIMEOUT', '300'))
+# Split the sync across this many processes by id_dokumen % SYNC_SHARDS
+SYNC_SHARDS = int(get_env_variable('SYNC_SHARDS', '1'))
 
 # Folder to Watch
 WATCHED_FOLDER = get_absolute_path(
     get_env_variable('WATCHED_FOLDER', 'documents')
 )
+# Seconds the file watcher collects changes before syncing them together
+WATCH_DEBOUNCE_SECONDS = float(get_env_variable('WATCH_DEBOUNCE_SECONDS', '2'))
+# Poll the watched folder at this interval instead of using file system events; 0 disables polling
+WATCH_POLL_SECONDS = float(get_env_variable('WATCH_POLL_SECONDS', '0'))
 
 # Cache File Paths
 CACHE_DIR = get_absolute_path('.cache')
@@ -4,22 +4,23 @@ Pytest configuration and test fixtures for PostgreSQL GCS Synchronizer
 import pytest
 import os
 import tempfile
-import shutil
-from unittest.mock import Mock, patch
+from unittest.mock import MagicMock, patch
 import psycopg2
+from google.cloud import storage
+
+# clickhouse_to_gcs opens its log file on import; keep test runs out of the repo's logs/
+os.environ.setdefault('LOG_DIR', tempfile.mkdtemp(prefix='pmen-sync-test-logs-'))
 
 
 @pytest.fixture
-def temp_directory():
-    """Create a temporary directory for testing"""
-    temp_dir = tempfile.mkdtemp()
-    yield temp_dir
-    shutil.rmtree(temp_dir)
+def temp_directory(tmp_path):
+    """Create a temporary directory for testing, unique to the test and xdist worker"""
+    return str(tmp_path)
 
 
-@pytest.fixture
+@pytest.fixture(scope='module')
 def sample_documents():
-    """Sample document data for testing"""
+    """Sample document data for testing; shared read-only across a module"""
     return [
         {
             'id_base': 1,
@@ -52,25 +53,58 @@ def sample_documents():
 def mock_postgres_connection():
     """Mock PostgreSQL connection"""
     with patch('clickhouse_to_gcs.psycopg2.connect') as mock_connect:
-        mock_conn = Mock()
-        mock_cursor = Mock()
+        mock_conn = MagicMock(spec=psycopg2.extensions.connection)
+        mock_cursor = MagicMock(spec=psycopg2.extensions.cursor)
         
-        # Create a mock context manager for cursor
-        mock_cursor_context = Mock()
-        mock_cursor_context.__enter__ = Mock(return_value=mock_cursor)
-        mock_cursor_context.__exit__ = Mock(return_value=None)
-        mock_conn.cursor.return_value = mock_cursor_context
+        # Like a psycopg2 cursor, the mock is its own context manager
+        mock_cursor.__enter__.return_value = mock_cursor
+        mock_conn.cursor.return_value = mock_cursor
         
         mock_connect.return_value = mock_conn
         yield mock_conn, mock_cursor
 
 
+def make_gcs_mocks():
+    """Return (client, bucket, blob) mocks specced to the storage classes, chained together"""
+    mock_client = MagicMock(spec=storage.Client)
+    mock_bucket = MagicMock(spec=storage.Bucket)
+    mock_blob = MagicMock(spec=storage.Blob)
+    mock_client.bucket.return_value = mock_bucket
+    mock_bucket.blob.return_value = mock_blob
+    return mock_client, mock_bucket, mock_blob
+
+
+@pytest.fixture
+def gcs_mocks():
+    """GCS client, bucket and blob mocks from make_gcs_mocks"""
+    return make_gcs_mocks()
+
+
+@pytest.fixture(scope='session')
+def pg_connection():
+    """One real PostgreSQL connection shared by the integration tests; skips them when unavailable"""
+    import config
+    try:
+        conn = psycopg2.connect(
+            host=config.POSTGRES_HOST,
+            port=config.POSTGRES_PORT,
+            user=config.POSTGRES_USER,
+            password=config.POSTGRES_PASSWORD,
+            dbname=config.POSTGRES_DB,
+            connect_timeout=5
+        )
+    except psycopg2.OperationalError as e:
+        pytest.skip(f"PostgreSQL is not available: {e}")
+    yield conn
+    conn.close()
+
+
 @pytest.fixture
 def mock_gcs_client():
     """Mock GCS client"""
-    with patch('clickhouse_to_gcs.storage.Client') as mock_client_class:
-        mock_client = Mock()
-        mock_client_class.return_value = mock_client
+    # Specced before the patch replaces storage.Client
+    mock_client, _, _ = make_gcs_mocks()
+    with patch('clickhouse_to_gcs.storage.Client', return_value=mock_client):
         yield mock_client
 
 
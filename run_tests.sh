@@ -14,20 +14,15 @@ fi
 echo "📦 Installing test dependencies..."
 pip install -r requirements-test.txt
 
-echo ""
-echo "🏃 Running unittest test suite..."
-echo "--------------------------------"
-python test_synchronizer.py
-
 echo ""
 echo "🏃 Running pytest test suite..."
 echo "------------------------------"
-pytest test_pytest_cases.py -v --tb=short
+pytest test_synchronizer.py test_pytest_cases.py -v --tb=short -n auto
 
 echo ""
 echo "📊 Running tests with coverage..."
 echo "--------------------------------"
-pytest test_pytest_cases.py --cov=clickhouse_to_gcs --cov=config --cov-report=html --cov-report=term
+pytest test_synchronizer.py test_pytest_cases.py -n auto --cov=clickhouse_to_gcs --cov=config --cov-report=html --cov-report=term
 
 echo ""
 echo "✅ Test execution completed!"
@@ -22,8 +22,20 @@ schedule.every().day.at("00:00").do(job)
 # schedule.every().hour.do(job)
 # schedule.every().monday.do(job)
 
+# Seconds to wait before checking again when no job is scheduled
+NO_JOB_SLEEP_SECONDS = 3600
+
+def seconds_until_next_run():
+    """Returns how long to sleep before the next job is due, at least one second."""
+    idle_seconds = schedule.idle_seconds()
+    if idle_seconds is None:
+        return NO_JOB_SLEEP_SECONDS
+    # A job that is already due is negative idle time
+    return max(1, idle_seconds)
+
 if __name__ == '__main__':
     logging.info("Scheduler started. Waiting for the scheduled time to run the job.")
     while True:
+        # Sleep until the next job is due instead of polling every second
+        time.sleep(seconds_until_next_run())
         schedule.run_pending()
-        time.sleep(1)
@@ -3,53 +3,90 @@
 import os
 import time
 import logging
+import itertools
 import json
+import mimetypes
+import re
+import stat
+import threading
+from concurrent.futures import ThreadPoolExecutor, as_completed
 from watchdog.observers import Observer
-from watchdog.events import FileSystemEventHandler
+from watchdog.events import FileCreatedEvent, FileModifiedEvent, FileSystemEventHandler
 from google.cloud import storage
+from google.cloud.storage import transfer_manager
+from google.cloud.storage.retry import DEFAULT_RETRY
 from clickhouse_driver import Client
+from requests.adapters import HTTPAdapter
 import config
 
 # --- Logging Setup ---
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
 
+# Clients are created on first use and reused for the life of the process,
+# so scheduled runs do not repeat the connection and auth handshakes
+_gcs_client = None
+_clickhouse_client = None
+
 # --- GCS Connection ---
 def get_gcs_client():
-    """Initializes and returns a GCS client."""
-    if config.GCS_SERVICE_ACCOUNT_KEY:
-        return storage.Client.from_service_account_json(config.GCS_SERVICE_ACCOUNT_KEY)
-    return storage.Client()
+    """Initializes a GCS client on first use and returns it."""
+    global _gcs_client
+    if _gcs_client is None:
+        if config.GCS_SERVICE_ACCOUNT_KEY:
+            _gcs_client = storage.Client.from_service_account_json(config.GCS_SERVICE_ACCOUNT_KEY)
+        else:
+            _gcs_client = storage.Client()
+        # Upload threads share the client's HTTP session; size its connection
+        # pool so every thread keeps its TLS connection between uploads
+        pool_size = config.UPLOAD_WORKERS + config.PARALLEL_UPLOAD_WORKERS
+        _gcs_client._http.mount('https://', HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size))
+    return _gcs_client
 
 # --- ClickHouse Connection ---
 def get_clickhouse_client():
-    """Initializes and returns a ClickHouse client."""
-    return Client(
-        host=config.CLICKHOUSE_HOST,
-        port=config.CLICKHOUSE_PORT,
-        user=config.CLICKHOUSE_USER,
-        password=config.CLICKHOUSE_PASSWORD,
-        database=config.CLICKHOUSE_DATABASE
-    )
+    """Initializes a ClickHouse client on first use and returns it; it reconnects by itself."""
+    global _clickhouse_client
+    if _clickhouse_client is None:
+        _clickhouse_client = Client(
+            host=config.CLICKHOUSE_HOST,
+            port=config.CLICKHOUSE_PORT,
+            user=config.CLICKHOUSE_USER,
+            password=config.CLICKHOUSE_PASSWORD,
+            database=config.CLICKHOUSE_DATABASE
+        )
+    return _clickhouse_client
 
 # --- File Validation ---
-def get_db_filepath(local_file_path, clickhouse_client):
-    """Fetches the file_path from ClickHouse that corresponds to the local file."""
-    # Get the relative path from the 'document' directory
-    relative_path = os.path.relpath(local_file_path, config.WATCHED_FOLDER).replace('\\', '/')
+# The watched folder is absolute, so paths below it are sliced off this prefix
+WATCHED_PREFIX = os.path.join(config.WATCHED_FOLDER, '')
+
+def get_relative_path(local_file_path):
+    """Returns the path of a local file relative to the watched folder, with '/' separators."""
+    if local_file_path.startswith(WATCHED_PREFIX):
+        relative_path = local_file_path[len(WATCHED_PREFIX):]
+    else:
+        relative_path = os.path.relpath(local_file_path, config.WATCHED_FOLDER)
+    return relative_path.replace('\\', '/')
+
+def get_db_filepaths(local_paths, clickhouse_client):
+    """
+    Fetches the file_paths in ClickHouse that correspond to the given local files,
+    in a single query. Returns a set of relative file paths, or None if the
+    query failed and the files could not be validated.
+    """
+    relative_paths = tuple({get_relative_path(p) for p in local_paths})
+    if not relative_paths:
+        return set()
 
-    # Query to find a matching file_path in the database
     # This assumes your table is named 'dokumen' and the column is 'file_path'
-    query = f"SELECT file_path FROM dokumen WHERE file_path = '{relative_path}'"
+    query = "SELECT file_path FROM dokumen WHERE file_path IN %(paths)s"
 
     try:
-        result = clickhouse_client.execute(query)
-        if result:
-            # Return the file_path from the database
-            return result[0][0]
+        result = clickhouse_client.execute(query, {'paths': relative_paths})
+        return {row[0] for row in result}
     except Exception as e:
-        logging.error(f"Error validating file {relative_path} in ClickHouse: {e}")
-    
-    return None
+        logging.error(f"Error validating {len(relative_paths)} files in ClickHouse: {e}")
+        return None
 
 # --- Cache Management (JSON) ---
 def read_cache(cache_file):
@@ -63,51 +100,271 @@ def read_cache(cache_file):
         return []
 
 def write_cache(data, cache_file):
-    """Writes a list of file paths to a JSON cache file."""
-    with open(cache_file, 'w') as f:
+    """Writes a list of file paths to a JSON cache file, replacing it atomically."""
+    # A crash mid-write leaves the old file in place instead of a truncated one
+    tmp_file = cache_file + '.tmp'
+    with open(tmp_file, 'w') as f:
         json.dump(data, f, indent=4)
+    os.replace(tmp_file, cache_file)
+
+class CacheSet:
+    """
+    A cache file of newline-delimited JSON file paths, held in memory as a set.
+    The file is read once and each addition appends a single line, so a run
+    writes O(new entries) bytes instead of rewriting the whole cache.
+    A file in the older JSON list format is converted to NDJSON on load.
+    """
+    def __init__(self, cache_file):
+        self.cache_file = cache_file
+        self._set = set()
+        self._lines = 0
+        self._log = None
+        # Set when the file ends in a line cut short, which the next append must not extend
+        self._unterminated = False
 
-def add_to_cache(file_path, cache_file):
-    """Adds a file path to a JSON cache file, avoiding duplicates."""
-    cache_data = read_cache(cache_file)
-    if file_path not in cache_data:
-        cache_data.append(file_path)
-        write_cache(cache_data, cache_file)
+    def load(self):
+        """Reads every path in the cache file."""
+        self._set = set()
+        self._lines = 0
+        self._unterminated = False
+        if not os.path.exists(self.cache_file):
+            return self
+        with open(self.cache_file, 'r') as f:
+            first_line = f.readline()
+            legacy_format = first_line.lstrip().startswith('[')
+            if not legacy_format:
+                for line in itertools.chain([first_line], f):
+                    self._unterminated = not line.endswith('\n')
+                    if not line.strip():
+                        continue
+                    try:
+                        self._set.add(json.loads(line))
+                        self._lines += 1
+                    except json.JSONDecodeError:
+                        # A line cut short by a crash
+                        continue
+        if legacy_format:
+            self._set = set(read_cache(self.cache_file))
+            self._rewrite()
+        return self
 
-def is_in_cache(file_path, cache_file):
-    """Checks if a file path is in a JSON cache file."""
-    return file_path in read_cache(cache_file)
+    def contains(self, file_path):
+        return file_path in self._set
+
+    def add(self, file_path):
+        """Adds a file path, appending it to the cache file if it is new."""
+        if file_path in self._set:
+            return
+        self._set.add(file_path)
+        if self._log is None:
+            self._log = open(self.cache_file, 'a', buffering=1)
+            if self._unterminated:
+                self._log.write('\n')
+                self._unterminated = False
+        self._log.write(json.dumps(file_path) + '\n')
+        self._lines += 1
+
+    def compact(self):
+        """Closes the cache file, rewriting it if duplicate lines make up more than half of it."""
+        if self._log is not None:
+            self._log.close()
+            self._log = None
+        if self._lines > 2 * len(self._set):
+            self._rewrite()
+
+    def _rewrite(self):
+        tmp_file = self.cache_file + '.tmp'
+        with open(tmp_file, 'w') as f:
+            for file_path in sorted(self._set):
+                f.write(json.dumps(file_path) + '\n')
+        os.replace(tmp_file, self.cache_file)
+        self._lines = len(self._set)
+        self._unterminated = False
 
 # --- File System Event Handler ---
+# Only document files are synced; paths are checked by name before any I/O
+DOCUMENT_FILE_RE = re.compile(r'\.(pdf|docx?|xlsx?)$', re.IGNORECASE)
+# Hidden directories and files (.git, .cache, editor swap files) and editor lock files
+EXCLUDED_PATH_PARTS = (os.sep + '.', os.sep + '~')
+# Flush early when a burst collects this many files
+MAX_PENDING_FILES = 1000
+
+def is_document_path(file_path):
+    """Checks whether a path under the watched folder can be a synced document."""
+    if not DOCUMENT_FILE_RE.search(file_path):
+        return False
+    # Only the part below the watched folder, which may itself sit in a hidden directory
+    relative_part = file_path[len(config.WATCHED_FOLDER):]
+    return not any(part in relative_part for part in EXCLUDED_PATH_PARTS)
+
 class Watcher(FileSystemEventHandler):
-    """Handles file system events."""
+    """
+    Handles file system events.
+    Created and modified files are collected in memory and added to the
+    'update-soon' cache in one write once events have been quiet for
+    `debounce_seconds`, or as soon as MAX_PENDING_FILES are pending.
+    """
+    def __init__(self, debounce_seconds=config.WATCH_DEBOUNCE_SECONDS):
+        super().__init__()
+        self.debounce_seconds = debounce_seconds
+        self._pending = set()
+        self._lock = threading.Lock()
+        # A timer flush may still be running when a burst flushes
+        self._write_lock = threading.Lock()
+        self._timer = None
+
     def on_any_event(self, event):
         if event.is_directory:
             return
 
-        # On created or modified, add to the 'update-soon' cache
+        # On created or modified, queue the file for the 'update-soon' cache
         if event.event_type in ['created', 'modified']:
-            logging.info(f"Detected {event.event_type}: {event.src_path}")
-            if not is_in_cache(event.src_path, config.UPDATE_SOON_CACHE):
-                add_to_cache(event.src_path, config.UPDATE_SOON_CACHE)
-                logging.info(f"Added to update-soon cache: {event.src_path}")
+            if not is_document_path(event.src_path):
+                return
+            logging.debug("Detected %s: %s", event.event_type, event.src_path)
+            with self._lock:
+                self._pending.add(event.src_path)
+                if self._timer is not None:
+                    self._timer.cancel()
+                burst_full = len(self._pending) >= MAX_PENDING_FILES
+                if not burst_full:
+                    self._timer = threading.Timer(self.debounce_seconds, self.flush)
+                    self._timer.daemon = True
+                    self._timer.start()
+            if burst_full:
+                self.flush()
 
         # On deleted, you might want to handle this as well.
         # For now, we'll just log it.
         if event.event_type == 'deleted':
             logging.info(f"Detected deleted file: {event.src_path}")
 
+    def flush(self):
+        """Adds the files collected since the last flush to the 'update-soon' cache."""
+        with self._lock:
+            pending, self._pending = self._pending, set()
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+        if not pending:
+            return
+
+        with self._write_lock:
+            cache_data = read_cache(config.UPDATE_SOON_CACHE)
+            new_files = pending.difference(cache_data)
+            if new_files:
+                write_cache(cache_data + sorted(new_files), config.UPDATE_SOON_CACHE)
+        if new_files:
+            logging.info(f"Added {len(new_files)} files to update-soon cache")
+
+    def stop(self):
+        """Cancels the debounce timer and adds the files still pending to the cache."""
+        self.flush()
+
+# Directory listings cached within this long of the directory's mtime are not trusted
+MTIME_GRANULARITY_NS = 2 * 10**9
+
+class MtimePoller:
+    """
+    Polls a directory tree for created and modified files, for network mounts
+    where file system events are not delivered. Directory listings are cached
+    and only read again when the directory's own mtime changes; files in
+    unchanged directories are only stat'ed.
+    """
+    def __init__(self, root, handler):
+        self.root = root
+        self.handler = handler
+        self._dirs = {}
+        # The first scan is the baseline; files already present are not reported
+        self._files = self._scan()
+
+    def poll(self):
+        """Scans the tree once, dispatching created and modified files to the handler."""
+        files = self._scan()
+        for file_path, mtime_ns in files.items():
+            previous_mtime_ns = self._files.get(file_path)
+            if previous_mtime_ns is None:
+                self.handler.dispatch(FileCreatedEvent(file_path))
+            elif previous_mtime_ns != mtime_ns:
+                self.handler.dispatch(FileModifiedEvent(file_path))
+        self._files = files
+
+    def _scan(self):
+        """Returns the mtime of every file in the tree, refreshing the cached listings."""
+        dirs = {}
+        files = {}
+        stack = [self.root]
+        while stack:
+            dir_path = stack.pop()
+            try:
+                dir_mtime_ns = os.stat(dir_path).st_mtime_ns
+            except OSError:
+                continue
+            listing = self._dirs.get(dir_path)
+            # Network filesystems may store mtimes at one or two second
+            # granularity, so a listing read right after a change is read again
+            if (listing is None or listing[0] != dir_mtime_ns
+                    or listing[1] - dir_mtime_ns < MTIME_GRANULARITY_NS):
+                scanned_at_ns = time.time_ns()
+                subdirs, dir_files = [], []
+                try:
+                    with os.scandir(dir_path) as entries:
+                        for entry in entries:
+                            if entry.is_dir(follow_symlinks=False):
+                                subdirs.append(entry.path)
+                            elif entry.is_file():
+                                dir_files.append(entry.path)
+                except OSError:
+                    continue
+                listing = (dir_mtime_ns, scanned_at_ns, subdirs, dir_files)
+            dirs[dir_path] = listing
+            for file_path in listing[3]:
+                try:
+                    files[file_path] = os.stat(file_path).st_mtime_ns
+                except OSError:
+                    continue
+            stack.extend(listing[2])
+        # Directories that disappeared drop out of the cache
+        self._dirs = dirs
+        return files
+
 # --- Main Synchronization Logic ---
+# Concurrent existence checks on pending files
+STAT_WORKERS = 32
+# Pending files validated against ClickHouse per query
+VALIDATION_BATCH_SIZE = 500
+
+def get_file_size(file_path):
+    """Returns the size of a regular file, or None if there is no such file."""
+    try:
+        file_stat = os.stat(file_path)
+    except OSError:
+        return None
+    return file_stat.st_size if stat.S_ISREG(file_stat.st_mode) else None
+
+def upload_file(blob, file_path, size):
+    """Uploads a local file of a known size to a blob."""
+    if size > config.PARALLEL_UPLOAD_THRESHOLD_MB * 1024 * 1024:
+        # Large files go up as concurrently uploaded chunks, composed by GCS
+        transfer_manager.upload_chunks_concurrently(
+            file_path, blob,
+            chunk_size=config.PARALLEL_UPLOAD_CHUNK_SIZE_MB * 1024 * 1024,
+            worker_type=transfer_manager.THREAD,
+            max_workers=config.PARALLEL_UPLOAD_WORKERS
+        )
+        return
+    # Passing the size saves the client a second stat; files below the
+    # client's chunk size go up in a single request
+    with open(file_path, 'rb') as f:
+        blob.upload_from_file(f, size=size, content_type=mimetypes.guess_type(file_path)[0],
+                              retry=DEFAULT_RETRY)
+
 def process_pending_files():
     """Processes files listed in the 'update-soon' cache."""
     if not os.path.exists(config.UPDATE_SOON_CACHE):
         logging.info("No update-soon cache file found. Nothing to process.")
         return
 
-    gcs_client = get_gcs_client()
-    clickhouse_client = get_clickhouse_client()
-    bucket = gcs_client.bucket(config.GCS_BUCKET_NAME)
-
     pending_files = read_cache(config.UPDATE_SOON_CACHE)
     if not pending_files:
         logging.info("No pending files to process.")
@@ -117,37 +374,85 @@ def process_pending_files():
     clickhouse_client = get_clickhouse_client()
     bucket = gcs_client.bucket(config.GCS_BUCKET_NAME)
 
-    processed_in_session = []
+    processed_files = CacheSet(config.PROCESSED_FILES_LOG).load()
+    try:
+        _process_pending_files(pending_files, processed_files, clickhouse_client, bucket)
+    finally:
+        processed_files.compact()
+
+def _validated_uploads(file_paths, clickhouse_client, processed_in_session):
+    """
+    Yields (file_path, db_filepath, size) for the files that exist and are known
+    to ClickHouse. Files are stat'ed concurrently and validated
+    VALIDATION_BATCH_SIZE at a time, so the first uploads start while later
+    batches are still being checked. Rejected files are added to `processed_in_session`.
+    """
+    # Each stat waits on the filesystem, which is slow on network mounts,
+    # so the checks run concurrently
+    with ThreadPoolExecutor(max_workers=STAT_WORKERS) as executor:
+        sized_files = zip(file_paths, executor.map(get_file_size, file_paths))
+        while batch := list(itertools.islice(sized_files, VALIDATION_BATCH_SIZE)):
+            candidates = []
+            for file_path, size in batch:
+                if size is None:
+                    logging.warning("File not found, skipping: %s", file_path)
+                    processed_in_session.add(file_path)
+                    continue
+
+                candidates.append((file_path, size))
+
+            # Validate the batch against ClickHouse in one round trip
+            valid_filepaths = get_db_filepaths([file_path for file_path, _ in candidates], clickhouse_client)
+            if valid_filepaths is None:
+                # Left in the update-soon cache for the next run
+                logging.warning("Could not validate %d files, keeping them pending", len(candidates))
+                continue
+            for file_path, size in candidates:
+                db_filepath = get_relative_path(file_path)
+                if db_filepath in valid_filepaths:
+                    logging.debug("File is valid, queued for upload to GCS path: %s", db_filepath)
+                    yield file_path, db_filepath, size
+                else:
+                    logging.warning("File not found in ClickHouse, skipping: %s", file_path)
+                    processed_in_session.add(file_path)
+
+def _process_pending_files(pending_files, processed_files, clickhouse_client, bucket):
+    """Validates and uploads pending files, recording uploads in `processed_files`."""
+    processed_in_session = set()
+    unprocessed = []
 
     for file_path in pending_files:
-        if not os.path.exists(file_path):
-            logging.warning(f"File not found, skipping: {file_path}")
-            processed_in_session.append(file_path)
+        if processed_files.contains(file_path):
+            logging.debug("Already processed, skipping: %s", file_path)
+            processed_in_session.add(file_path)
             continue
 
-        if is_in_cache(file_path, config.PROCESSED_FILES_LOG):
-            logging.info(f"Already processed, skipping: {file_path}")
-            processed_in_session.append(file_path)
-            continue
+        unprocessed.append(file_path)
 
-        db_filepath = get_db_filepath(file_path, clickhouse_client)
-        if db_filepath:
-            logging.info(f"File is valid, uploading to GCS path: {db_filepath}")
+    # Uploads wait on the network, so run them concurrently, submitting each
+    # validated batch as it arrives.
+    # Results are collected on this thread only, so the caches need no lock.
+    uploads = _validated_uploads(unprocessed, clickhouse_client, processed_in_session)
+    with ThreadPoolExecutor(max_workers=config.UPLOAD_WORKERS) as executor:
+        futures = {
+            executor.submit(upload_file, bucket.blob(db_filepath), file_path, size): file_path
+            for file_path, db_filepath, size in uploads
+        }
+        for future in as_completed(futures):
+            file_path = futures[future]
             try:
-                blob = bucket.blob(db_filepath)
-                blob.upload_from_filename(file_path)
-                logging.info(f"Successfully uploaded: {file_path}")
-                add_to_cache(file_path, config.PROCESSED_FILES_LOG)
-                processed_in_session.append(file_path)
+                future.result()
+                logging.info("Successfully uploaded: %s", file_path)
+                processed_files.add(file_path)
+                processed_in_session.add(file_path)
             except Exception as e:
-                logging.error(f"Failed to upload {file_path}: {e}")
-        else:
-            logging.warning(f"File not found in ClickHouse, skipping: {file_path}")
-            processed_in_session.append(file_path)
+                logging.error("Failed to upload %s: %s", file_path, e)
 
     # Clean up the update-soon cache
     remaining_files = [p for p in pending_files if p not in processed_in_session]
     write_cache(remaining_files, config.UPDATE_SOON_CACHE)
+    logging.info(f"Processed {len(pending_files)} pending files: {len(futures)} uploads attempted, "
+                 f"{len(remaining_files)} left for the next run")
 
 if __name__ == '__main__':
     # This part handles manual triggering and file watching.
@@ -158,14 +463,27 @@ if __name__ == '__main__':
 
     # Then, start watching for new changes
     event_handler = Watcher()
-    observer = Observer()
-    observer.schedule(event_handler, config.WATCHED_FOLDER, recursive=True)
-    observer.start()
-    logging.info(f"Watching for file changes in {config.WATCHED_FOLDER}")
+    if config.WATCH_POLL_SECONDS:
+        # Network mounts do not deliver file system events, so poll instead
+        poller = MtimePoller(config.WATCHED_FOLDER, event_handler)
+        logging.info(f"Polling for file changes in {config.WATCHED_FOLDER} "
+                     f"every {config.WATCH_POLL_SECONDS} seconds")
+        try:
+            while True:
+                time.sleep(config.WATCH_POLL_SECONDS)
+                poller.poll()
+        except KeyboardInterrupt:
+            pass
+    else:
+        observer = Observer()
+        observer.schedule(event_handler, config.WATCHED_FOLDER, recursive=True)
+        observer.start()
+        logging.info(f"Watching for file changes in {config.WATCHED_FOLDER}")
 
-    try:
-        while True:
-            time.sleep(1)
-    except KeyboardInterrupt:
-        observer.stop()
-    observer.join()
+        try:
+            while True:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            observer.stop()
+        observer.join()
+    event_handler.stop()
@@ -4,7 +4,8 @@ Additional pytest-based test cases for better test organization
 import pytest
 import os
 import json
-from unittest.mock import Mock, patch, call
+from datetime import datetime
+from unittest.mock import ANY, Mock, patch
 import psycopg2
 
 import clickhouse_to_gcs
@@ -20,7 +21,7 @@ class TestPostgreSQLIntegration:
         result = clickhouse_to_gcs.get_postgres_connection()
         
         assert result == mock_conn
-        mock_cursor.execute.assert_called_once_with('SELECT 1')
+        mock_conn.cursor.assert_not_called()
     
     def test_postgres_query_execution(self, mock_postgres_connection):
         """Test PostgreSQL query execution"""
@@ -39,6 +40,18 @@ class TestPostgreSQLIntegration:
         assert results[0]['id'] == 1
         assert results[1]['name'] == 'Another Doc'
     
+    def test_postgres_streaming_query(self, mock_postgres_connection):
+        """Test streaming query results through a server-side cursor"""
+        mock_conn, mock_cursor = mock_postgres_connection
+        mock_cursor.__iter__ = Mock(return_value=iter([{'id': 1}, {'id': 2}]))
+        
+        rows = clickhouse_to_gcs.iter_query_postgres(mock_conn, "SELECT * FROM test_table", itersize=10)
+        
+        assert list(rows) == [{'id': 1}, {'id': 2}]
+        assert mock_conn.cursor.call_args[1]['name'] == 'pmen_sync_stream'
+        assert mock_cursor.itersize == 10
+        mock_cursor.execute.assert_called_once_with("SELECT * FROM test_table", None)
+    
     def test_get_documents_query_format(self, mock_postgres_connection):
         """Test that get_documents_from_postgres formats query correctly"""
         mock_conn, mock_cursor = mock_postgres_connection
@@ -54,6 +67,47 @@ class TestPostgreSQLIntegration:
             assert 'ORDER BY id_dokumen DESC' in query
             assert 'LIMIT %(limit)s' in query
 
+    
+    def test_get_documents_excludes_processed_ids(self, mock_postgres_connection):
+        """Test that processed IDs are filtered out by the database query"""
+        mock_conn, mock_cursor = mock_postgres_connection
+        
+        with patch('clickhouse_to_gcs.query_postgres', return_value=[]) as mock_query:
+            clickhouse_to_gcs.get_documents_from_postgres(mock_conn, limit=500, exclude_ids={'123'})
+            
+            query = mock_query.call_args[0][1]
+            params = mock_query.call_args[1]['params']
+            assert 'NOT (id_dokumen::text = ANY(%(exclude_ids)s))' in query
+            assert params == {'limit': 500, 'exclude_ids': ['123']}
+
+    def test_get_documents_stages_large_exclusions(self, mock_postgres_connection):
+        """Test that large processed ID sets are anti-joined through a temporary table"""
+        mock_conn, mock_cursor = mock_postgres_connection
+
+        with patch('clickhouse_to_gcs.EXCLUDE_IDS_TEMP_TABLE_THRESHOLD', 1), \
+             patch('clickhouse_to_gcs.psycopg2.extras.execute_values') as mock_execute_values, \
+             patch('clickhouse_to_gcs.query_postgres', return_value=[]) as mock_query:
+            clickhouse_to_gcs.get_documents_from_postgres(mock_conn, limit=500, exclude_ids={'1', '2'})
+
+            query = mock_query.call_args[0][1]
+            params = mock_query.call_args[1]['params']
+            assert 'NOT EXISTS (SELECT 1 FROM pmen_excluded_ids' in query
+            assert params == {'limit': 500}
+            assert sorted(mock_execute_values.call_args[0][2]) == [('1',), ('2',)]
+
+    def test_get_documents_for_shard(self, mock_postgres_connection):
+        """Test that a shard only queries its own IDs and its share of the limit"""
+        mock_conn, mock_cursor = mock_postgres_connection
+
+        with patch('clickhouse_to_gcs.query_postgres', return_value=[]) as mock_query:
+            clickhouse_to_gcs.get_documents_from_postgres(
+                mock_conn, limit=500, exclude_ids={'123'}, shard=(1, 3)
+            )
+
+            query = mock_query.call_args[0][1]
+            params = mock_query.call_args[1]['params']
+            assert 'AND mod(id_dokumen, %(shard_count)s) = %(shard_id)s' in query
+            assert params == {'limit': 167, 'exclude_ids': ['123'], 'shard_id': 1, 'shard_count': 3}
 
 class TestFileHandling:
     """Test file handling functionality"""
@@ -78,12 +132,31 @@ class TestFileHandling:
         result = clickhouse_to_gcs.find_local_file('nonexistent.pdf', temp_directory)
         assert result is None
     
+    def test_find_local_file_sees_new_files(self, temp_directory):
+        """Test that searches without an index do not reuse stale directory listings"""
+        sub_dir = os.path.join(temp_directory, 'sub')
+        os.makedirs(sub_dir)
+        assert clickhouse_to_gcs.find_local_file('late.pdf', temp_directory) is None
+
+        late_file = os.path.join(sub_dir, 'late.pdf')
+        with open(late_file, 'w') as f:
+            f.write('content')
+
+        assert clickhouse_to_gcs.find_local_file('late.pdf', temp_directory) == late_file
+    
+    def test_relative_document_path(self, temp_directory):
+        """Test relative paths are sliced off the documents directory prefix"""
+        root_prefix = os.path.join(os.path.abspath(temp_directory), '')
+        local_path = os.path.join(temp_directory, 'a', 'b', 'document.pdf')
+        
+        assert clickhouse_to_gcs.relative_document_path(local_path, root_prefix) == 'a/b/document.pdf'
+        outside = os.path.join(os.path.dirname(os.path.abspath(temp_directory)), 'other.pdf')
+        assert clickhouse_to_gcs.relative_document_path(outside, root_prefix) == '../other.pdf'
+    
     def test_upload_to_gcs_success(self, test_file, mock_gcs_client):
         """Test successful GCS upload"""
-        mock_bucket = Mock()
-        mock_blob = Mock()
-        mock_gcs_client.bucket.return_value = mock_bucket
-        mock_bucket.blob.return_value = mock_blob
+        mock_bucket = mock_gcs_client.bucket.return_value
+        mock_blob = mock_bucket.blob.return_value
         
         result = clickhouse_to_gcs.upload_to_gcs(
             mock_gcs_client, 'test-bucket', test_file, 'test/path.pdf'
@@ -92,7 +165,11 @@ class TestFileHandling:
         assert result is True
         mock_gcs_client.bucket.assert_called_once_with('test-bucket')
         mock_bucket.blob.assert_called_once_with('test/path.pdf')
-        mock_blob.upload_from_filename.assert_called_once_with(test_file)
+        mock_blob.upload_from_file.assert_called_once_with(
+            ANY, size=os.path.getsize(test_file), content_type='application/pdf', checksum='crc32c',
+            timeout=(clickhouse_to_gcs.UPLOAD_CONNECT_TIMEOUT, clickhouse_to_gcs.UPLOAD_TIMEOUT),
+            retry=clickhouse_to_gcs.DEFAULT_RETRY
+        )
     
     def test_upload_to_gcs_file_not_exists(self, mock_gcs_client):
         """Test GCS upload with non-existent file"""
@@ -101,6 +178,15 @@ class TestFileHandling:
         )
         
         assert result is False
+    
+    def test_upload_to_gcs_directory(self, temp_directory, mock_gcs_client):
+        """Test GCS upload of a directory path"""
+        result = clickhouse_to_gcs.upload_to_gcs(
+            mock_gcs_client, 'test-bucket', temp_directory, 'test/path.pdf'
+        )
+        
+        assert result is False
+        mock_gcs_client.bucket.assert_not_called()
 
 
 class TestDocumentProcessing:
@@ -119,7 +205,22 @@ class TestDocumentProcessing:
         assert stats['total_documents'] == 2
         assert stats['already_processed'] == 1
         assert stats['to_process'] == 1
-    
+
+    @pytest.mark.parametrize('processed_cache', [{123}, frozenset({123}), frozenset({'123'})])
+    def test_filter_with_integer_cache(self, sample_documents, processed_cache):
+        """Test that cached IDs match documents whatever their type"""
+        unprocessed, stats = clickhouse_to_gcs.filter_unprocessed_documents(
+            sample_documents, processed_cache
+        )
+
+        assert [doc['id_dokumen'] for doc in unprocessed] == [124]
+        assert stats['already_processed'] == 1
+
+    def test_batched_documents(self):
+        """Test splitting a document stream into batches"""
+        batches = list(clickhouse_to_gcs.batched(iter(range(5)), 2))
+        assert batches == [[0, 1], [2, 3], [4]]
+
     def test_filter_all_processed(self, sample_documents):
         """Test when all documents are already processed"""
         processed_cache = {'123', '124'}
@@ -134,7 +235,7 @@ class TestDocumentProcessing:
     
     def test_load_processed_cache_empty(self, temp_directory):
         """Test loading cache when no reports exist"""
-        with patch('clickhouse_to_gcs.os.path.dirname', return_value=temp_directory):
+        with patch('clickhouse_to_gcs.REPORTS_DIR', os.path.join(temp_directory, 'reports')):
             cache = clickhouse_to_gcs.load_processed_cache()
             assert cache == set()
     
@@ -155,11 +256,277 @@ class TestDocumentProcessing:
         with open(report_file, 'w') as f:
             json.dump(report_data, f)
         
-        with patch('clickhouse_to_gcs.os.path.dirname', return_value=temp_directory):
+        with patch('clickhouse_to_gcs.REPORTS_DIR', os.path.join(temp_directory, 'reports')):
             cache = clickhouse_to_gcs.load_processed_cache()
             
         assert cache == {'123', '124'}
 
+    def test_process_documents_uploads_concurrently(self, temp_directory):
+        """Test that every resolved document is uploaded through the worker pool"""
+        for name in ('a.pdf', 'b.pdf', 'c.pdf'):
+            with open(os.path.join(temp_directory, name), 'w') as f:
+                f.write('content')
+        documents = [
+            {'id_dokumen': 1, 'file_path': '/documents/a.pdf'},
+            {'id_dokumen': 2, 'file_path': '/documents/b.pdf'},
+            {'id_dokumen': 3, 'file_path': '/documents/c.pdf'},
+            {'id_dokumen': 4, 'file_path': ''},
+            {'id_dokumen': 5, 'file_path': '/documents/missing.pdf'},
+        ]
+        
+        with patch('clickhouse_to_gcs.upload_to_gcs', return_value=True) as mock_upload:
+            stats = clickhouse_to_gcs.process_documents(
+                documents, Mock(), temp_directory, batch_size=2, max_workers=4
+            )
+        
+        assert mock_upload.call_count == 3
+        assert stats['processed'] == 3
+        assert stats['skipped_no_path'] == 1
+        assert stats['not_found'] == 1
+        assert stats['upload_errors'] == 0
+        assert sorted(f['gcs_path'] for f in stats['processed_files']) == [
+            'documents/main/a.pdf', 'documents/main/b.pdf', 'documents/main/c.pdf'
+        ]
+
+    def test_submit_bounded_limits_read_ahead(self):
+        """Test that items are only read while fewer than max_in_flight uploads are pending"""
+        from concurrent.futures import ThreadPoolExecutor
+        counts = {'read': 0, 'yielded': 0, 'ahead': 0}
+
+        def items():
+            for i in range(20):
+                counts['read'] += 1
+                counts['ahead'] = max(counts['ahead'], counts['read'] - counts['yielded'])
+                yield i
+
+        with ThreadPoolExecutor(max_workers=2) as pool:
+            results = []
+            for item, future in clickhouse_to_gcs._submit_bounded(pool, lambda x: x * 2, items(), 3):
+                counts['yielded'] += 1
+                results.append((item, future.result()))
+
+        assert sorted(results) == [(i, i * 2) for i in range(20)]
+        assert counts['ahead'] <= 4
+
+
+    def test_process_documents_with_autotune(self, temp_directory):
+        """Test that autotuning uploads the sample and then the remaining documents"""
+        documents = []
+        for i in range(20):
+            with open(os.path.join(temp_directory, f'doc{i}.pdf'), 'w') as f:
+                f.write('content')
+            documents.append({'id_dokumen': i, 'file_path': f'/documents/doc{i}.pdf'})
+        
+        with patch('clickhouse_to_gcs.upload_to_gcs', return_value=True) as mock_upload, \
+             patch('clickhouse_to_gcs.AUTOTUNE_LEVELS', (2, 4)):
+            stats = clickhouse_to_gcs.process_documents(
+                documents, Mock(), temp_directory, autotune=True
+            )
+        
+        assert mock_upload.call_count == 20
+        assert stats['processed'] == 20
+        assert len({f['id_dokumen'] for f in stats['processed_files']}) == 20
+
+
+    def test_process_documents_checkpoints_uploads(self, temp_directory):
+        """Test that uploaded documents are recorded in the processed store while processing"""
+        documents = []
+        for i in range(5):
+            with open(os.path.join(temp_directory, f'doc{i}.pdf'), 'w') as f:
+                f.write('content')
+            documents.append({'id_dokumen': i, 'file_path': f'/documents/doc{i}.pdf'})
+        reports_dir = os.path.join(temp_directory, 'reports')
+
+        with patch('clickhouse_to_gcs.upload_to_gcs', return_value=True), \
+             patch('clickhouse_to_gcs.record_processed_files',
+                   wraps=clickhouse_to_gcs.record_processed_files) as mock_record:
+            clickhouse_to_gcs.process_documents(
+                documents, Mock(), temp_directory, batch_size=2,
+                checkpoint_dir=reports_dir
+            )
+
+        assert mock_record.call_count == 3
+        conn = clickhouse_to_gcs.open_processed_db(reports_dir)
+        try:
+            ids = {row[0] for row in conn.execute("SELECT id_dokumen FROM processed")}
+        finally:
+            conn.close()
+        assert ids == {'0', '1', '2', '3', '4'}
+
+    def test_process_documents_stamps_each_batch_once(self, temp_directory):
+        """Test that uploads completing in the same batch share one timestamp"""
+        documents = []
+        for i in range(5):
+            with open(os.path.join(temp_directory, f'doc{i}.pdf'), 'w') as f:
+                f.write('content')
+            documents.append({'id_dokumen': i, 'file_path': f'doc{i}.pdf'})
+
+        ticks = (datetime(2024, 1, 1, 0, 0, second) for second in range(60))
+
+        with patch('clickhouse_to_gcs.upload_to_gcs', return_value=True), \
+             patch('clickhouse_to_gcs.datetime') as mock_datetime:
+            mock_datetime.now.side_effect = lambda: next(ticks)
+            stats = clickhouse_to_gcs.process_documents(documents, Mock(), temp_directory, batch_size=2)
+
+        # The first tick is the run's start time
+        assert [f['timestamp'][-2:] for f in stats['processed_files']] == ['01', '01', '02', '02', '03']
+
+    def test_resync_documents_uploads_concurrently(self, temp_directory):
+        """Test that resync uploads every document not yet synced"""
+        for name in ('a.pdf', 'b.pdf'):
+            with open(os.path.join(temp_directory, name), 'w') as f:
+                f.write('content')
+        documents = [
+            {'id_dokumen': 1, 'file_path': 'a.pdf'},
+            {'id_dokumen': 2, 'file_path': 'b.pdf'},
+            {'id_dokumen': 3, 'file_path': 'c.pdf'},
+            {'id_dokumen': 4, 'file_path': 'a.pdf'},
+        ]
+
+        # a.pdf is already identical in GCS
+        def upload(gcs_client, bucket_name, local_file, gcs_path, **kwargs):
+            return clickhouse_to_gcs.UPLOAD_UNCHANGED if gcs_path.endswith('a.pdf') else True
+
+        with patch('clickhouse_to_gcs.load_processed_cache', return_value=frozenset({'4'})), \
+             patch('clickhouse_to_gcs.get_documents_from_postgres', return_value=documents) as mock_get_docs, \
+             patch('clickhouse_to_gcs.upload_to_gcs', side_effect=upload) as mock_upload:
+            stats = clickhouse_to_gcs.resync_documents(Mock(), Mock(), temp_directory)
+
+        assert mock_get_docs.call_args[1]['limit'] is None
+        assert mock_upload.call_count == 2
+        assert stats['newly_synced'] == 1
+        assert stats['unchanged'] == 1
+        assert stats['already_synced'] == 1
+        assert stats['file_not_found'] == 1
+        assert sorted(f['gcs_path'] for f in stats['processed_files']) == [
+            'documents/main/a.pdf', 'documents/main/b.pdf'
+        ]
+
+    def test_resync_documents_lists_bucket_once(self, temp_directory, gcs_mocks):
+        """Test that large resyncs compare against one bucket listing"""
+        mock_client, mock_bucket, _ = gcs_mocks
+        with open(os.path.join(temp_directory, 'a.pdf'), 'w') as f:
+            f.write('content')
+        mock_bucket.list_blobs.return_value = []
+
+        with patch('clickhouse_to_gcs.RESYNC_LISTING_THRESHOLD', 1), \
+             patch('clickhouse_to_gcs.load_processed_cache', return_value=frozenset()), \
+             patch('clickhouse_to_gcs.get_documents_from_postgres',
+                   return_value=[{'id_dokumen': 1, 'file_path': 'a.pdf'}]), \
+             patch('clickhouse_to_gcs.upload_to_gcs', return_value=True) as mock_upload:
+            clickhouse_to_gcs.resync_documents(Mock(), mock_client, temp_directory)
+
+        mock_bucket.list_blobs.assert_called_once()
+        assert mock_upload.call_args[1]['remote_objects'] == {}
+
+    @pytest.mark.parametrize('listing_error, skip_unchanged', [
+        (clickhouse_to_gcs.Forbidden('storage.objects.list denied'), False),
+        (clickhouse_to_gcs.GoogleAPICallError('backend error'), True),
+    ])
+    def test_resync_documents_listing_fails(self, temp_directory, gcs_mocks, listing_error, skip_unchanged):
+        """Test that a refused listing uploads directly and other failures check objects one by one"""
+        mock_client, mock_bucket, _ = gcs_mocks
+        with open(os.path.join(temp_directory, 'a.pdf'), 'w') as f:
+            f.write('content')
+        mock_bucket.list_blobs.side_effect = listing_error
+
+        with patch('clickhouse_to_gcs.RESYNC_LISTING_THRESHOLD', 1), \
+             patch('clickhouse_to_gcs.load_processed_cache', return_value=frozenset()), \
+             patch('clickhouse_to_gcs.get_documents_from_postgres',
+                   return_value=[{'id_dokumen': 1, 'file_path': 'a.pdf'}]), \
+             patch('clickhouse_to_gcs.upload_to_gcs', return_value=True) as mock_upload:
+            stats = clickhouse_to_gcs.resync_documents(Mock(), mock_client, temp_directory)
+
+        assert mock_upload.call_args[1]['remote_objects'] is None
+        assert mock_upload.call_args[1]['skip_unchanged'] is skip_unchanged
+        assert stats['newly_synced'] == 1
+
+    def test_sync_paths_uploads_changed_files(self, temp_directory):
+        """Test that watcher changes are synced with one query for the whole batch"""
+        sub_dir = os.path.join(temp_directory, 'sub')
+        os.makedirs(sub_dir)
+        pathnames = [os.path.join(sub_dir, 'a.pdf'), os.path.join(temp_directory, 'new_1.pdf')]
+        for pathname in pathnames:
+            with open(pathname, 'w') as f:
+                f.write('content')
+        # new_1.pdf was created after the index was built
+        file_index = {'a.pdf': [(pathnames[0], 'sub/a.pdf')]}
+        documents = [{'id_dokumen': 7, 'file_path': 'sub/a.pdf'}, {'id_dokumen': 8, 'file_path': 'new_1.pdf'}]
+
+        with patch('clickhouse_to_gcs.query_postgres', return_value=documents) as mock_query, \
+             patch('clickhouse_to_gcs.upload_to_gcs', return_value=True) as mock_upload, \
+             patch('clickhouse_to_gcs.record_processed_files') as mock_record:
+            stats = clickhouse_to_gcs.sync_paths(Mock(), Mock(), pathnames, temp_directory, file_index)
+
+        assert mock_query.call_count == 1
+        assert mock_query.call_args[1]['params'] == {
+            'file_paths': ['new_1.pdf', 'sub/a.pdf'], 'filenames': ['a.pdf', 'new_1.pdf'],
+            'name_patterns': ['%/a.pdf', '%/new\\_1.pdf']
+        }
+        assert sorted(args[0][3] for args in mock_upload.call_args_list) == [
+            'documents/main/new_1.pdf', 'documents/main/sub/a.pdf'
+        ]
+        assert stats['processed'] == 2
+        assert file_index['new_1.pdf'] == [(pathnames[1], 'new_1.pdf')]
+        assert {f['id_dokumen'] for f in mock_record.call_args[0][0]} == {7, 8}
+
+    def test_sync_paths_matches_bare_filename(self, temp_directory):
+        """Test that a database path without directories matches a changed file in a subdirectory"""
+        sub_dir = os.path.join(temp_directory, 'sub')
+        os.makedirs(sub_dir)
+        pathname = os.path.join(sub_dir, 'a.pdf')
+        with open(pathname, 'w') as f:
+            f.write('content')
+
+        with patch('clickhouse_to_gcs.query_postgres',
+                   return_value=[{'id_dokumen': 7, 'file_path': 'a.pdf'}]) as mock_query, \
+             patch('clickhouse_to_gcs.upload_to_gcs', return_value=True) as mock_upload, \
+             patch('clickhouse_to_gcs.record_processed_files'):
+            clickhouse_to_gcs.sync_paths(Mock(), Mock(), [pathname], temp_directory, {})
+
+        assert 'file_path = ANY(%(filenames)s)' in mock_query.call_args[0][1]
+        assert mock_query.call_args[1]['params']['filenames'] == ['a.pdf']
+        # locate_local_file resolves the bare filename through the index
+        assert mock_upload.call_args[0][3] == 'documents/main/sub/a.pdf'
+
+    @patch('clickhouse_to_gcs.pyinotify', create=True)
+    def test_watcher_flush_requeues_failed_batch(self, mock_pyinotify, temp_directory):
+        """Test that a failed flush keeps its files pending and reconnects on the next flush"""
+        broken_conn, new_conn = Mock(closed=0), Mock(closed=0)
+        watcher = clickhouse_to_gcs.PMENFileWatcher(temp_directory, broken_conn, Mock(), {})
+        assert broken_conn.autocommit is True
+        watcher.pending = {'/docs/a.pdf', '/docs/b.pdf'}
+
+        with patch('clickhouse_to_gcs.sync_paths',
+                   side_effect=[psycopg2.OperationalError('server closed the connection'), {}]) as mock_sync, \
+             patch('clickhouse_to_gcs.get_postgres_connection', return_value=new_conn):
+            watcher.flush()
+
+            broken_conn.close.assert_called_once()
+            assert watcher.pg_conn is None
+            assert watcher.pending == {'/docs/a.pdf', '/docs/b.pdf'}
+
+            watcher.flush()
+
+        assert mock_sync.call_args[0][0] is new_conn
+        assert new_conn.autocommit is True
+        assert set(mock_sync.call_args[0][2]) == {'/docs/a.pdf', '/docs/b.pdf'}
+        assert watcher.pending == set()
+        assert watcher.failed_attempts == {}
+
+    @patch('clickhouse_to_gcs.pyinotify', create=True)
+    def test_watcher_flush_gives_up_after_max_attempts(self, mock_pyinotify, temp_directory):
+        """Test that a file failing every flush is dropped after WATCH_MAX_FLUSH_ATTEMPTS"""
+        watcher = clickhouse_to_gcs.PMENFileWatcher(temp_directory, Mock(closed=0), Mock(), {})
+        watcher.pending = {'/docs/a.pdf'}
+
+        with patch('clickhouse_to_gcs.sync_paths', side_effect=OSError('upload failed')) as mock_sync:
+            for _ in range(clickhouse_to_gcs.WATCH_MAX_FLUSH_ATTEMPTS + 1):
+                watcher.flush()
+
+        assert mock_sync.call_count == clickhouse_to_gcs.WATCH_MAX_FLUSH_ATTEMPTS
+        assert watcher.pending == set()
+        assert watcher.failed_attempts == {}
 
 class TestReportGeneration:
     """Test processing report functionality"""
@@ -175,7 +542,7 @@ class TestReportGeneration:
             ]
         }
         
-        with patch('clickhouse_to_gcs.os.path.dirname', return_value=temp_directory):
+        with patch('clickhouse_to_gcs.REPORTS_DIR', os.path.join(temp_directory, 'reports')):
             result_path = clickhouse_to_gcs.save_processing_report(stats)
         
         expected_path = os.path.join(temp_directory, 'reports', 'sync_report.json')
@@ -191,19 +558,35 @@ class TestReportGeneration:
         assert len(saved_data['processed_files']) == 2
 
 
+    @pytest.mark.parametrize('use_orjson', [True, False])
+    def test_json_file_round_trip(self, temp_directory, use_orjson):
+        """Test reading back a written report with and without orjson"""
+        path = os.path.join(temp_directory, 'report.json')
+        data = {'processed': 1, 'start_time': datetime(2024, 1, 1, 12, 0),
+                'processed_files': [{'id_dokumen': 1, 'gcs_path': 'documents/main/é.pdf'}]}
+
+        orjson_module = clickhouse_to_gcs.orjson if use_orjson else None
+        with patch('clickhouse_to_gcs.orjson', orjson_module):
+            clickhouse_to_gcs.write_json_file(path, data)
+            loaded = clickhouse_to_gcs.read_json_file(path)
+
+        assert loaded['processed'] == 1
+        assert loaded['start_time'].startswith('2024-01-01')
+        assert loaded['processed_files'][0]['gcs_path'] == 'documents/main/é.pdf'
+
+
 class TestMainWorkflow:
     """Test main workflow integration"""
     
     @patch('clickhouse_to_gcs.save_processing_report')
     @patch('clickhouse_to_gcs.process_documents')
-    @patch('clickhouse_to_gcs.filter_unprocessed_documents')
     @patch('clickhouse_to_gcs.load_processed_cache')
     @patch('clickhouse_to_gcs.get_documents_from_postgres')
     @patch('clickhouse_to_gcs.get_gcs_client')
     @patch('clickhouse_to_gcs.get_postgres_connection')
     @patch('clickhouse_to_gcs.os.makedirs')
     def test_main_workflow_success(self, mock_makedirs, mock_pg_conn, mock_gcs_client,
-                                 mock_get_docs, mock_load_cache, mock_filter_docs,
+                                 mock_get_docs, mock_load_cache,
                                  mock_process_docs, mock_save_report, sample_documents):
         """Test successful main workflow execution"""
         # Setup mocks
@@ -216,11 +599,9 @@ class TestMainWorkflow:
         mock_get_docs.return_value = sample_documents
         mock_load_cache.return_value = set()
         
-        mock_filter_stats = {'already_processed': 0, 'to_process': 2}
-        mock_filter_docs.return_value = (sample_documents, mock_filter_stats)
-        
         mock_process_stats = {'processed': 2, 'processed_files': []}
-        mock_process_docs.return_value = mock_process_stats
+        # Consume the streamed documents like process_documents does
+        mock_process_docs.side_effect = lambda docs, *args, **kwargs: (list(docs), mock_process_stats)[1]
         
         mock_save_report.return_value = '/test/report.json'
         
@@ -230,9 +611,8 @@ class TestMainWorkflow:
         # Verify workflow
         mock_pg_conn.assert_called_once()
         mock_gcs_client.assert_called_once()
-        mock_get_docs.assert_called_once_with(mock_conn)
+        mock_get_docs.assert_called_once_with(mock_conn, exclude_ids=set(), shard=None, stream=True)
         mock_load_cache.assert_called_once()
-        mock_filter_docs.assert_called_once_with(sample_documents, set())
         mock_process_docs.assert_called_once()
         mock_save_report.assert_called_once()
         mock_conn.close.assert_called_once()
@@ -241,7 +621,7 @@ class TestMainWorkflow:
     @patch('clickhouse_to_gcs.get_gcs_client')
     @patch('clickhouse_to_gcs.get_postgres_connection')
     @patch('clickhouse_to_gcs.os.makedirs')
-    def test_main_no_documents(self, mock_makedirs, mock_pg_conn, mock_gcs_client, mock_get_docs):
+    def test_main_no_documents(self, mock_makedirs, mock_pg_conn, mock_gcs_client, mock_get_docs, caplog):
         """Test main workflow when no documents found"""
         mock_conn = Mock()
         mock_pg_conn.return_value = mock_conn
@@ -252,9 +632,25 @@ class TestMainWorkflow:
         mock_get_docs.return_value = []  # No documents
         
         # Should not raise exception, just return early
-        clickhouse_to_gcs.main()
-        
+        with caplog.at_level('INFO', logger='clickhouse_to_gcs'):
+            clickhouse_to_gcs.main()
+
         mock_conn.close.assert_called_once()
+        # Processed IDs are excluded in SQL, so no rows is the steady state
+        assert any(r.levelname == 'INFO' and 'No new documents to process' in r.getMessage()
+                   for r in caplog.records)
+        assert not any(r.levelname == 'WARNING' for r in caplog.records)
+
+    def test_merge_shard_stats(self):
+        """Test merging statistics returned by shard processes"""
+        merged = clickhouse_to_gcs.merge_shard_stats([
+            {'processed': 2, 'upload_errors': 0, 'processed_files': [{'id_dokumen': 1}]},
+            {'processed': 3, 'upload_errors': 1, 'processed_files': [{'id_dokumen': 2}]},
+        ])
+
+        assert merged['processed'] == 5
+        assert merged['upload_errors'] == 1
+        assert merged['processed_files'] == [{'id_dokumen': 1}, {'id_dokumen': 2}]
 
 
 class TestErrorHandling:
@@ -276,14 +672,10 @@ class TestErrorHandling:
             with pytest.raises(Exception):
                 clickhouse_to_gcs.get_gcs_client()
     
-    def test_upload_gcs_error(self, test_file):
+    def test_upload_gcs_error(self, test_file, gcs_mocks):
         """Test GCS upload error handling"""
-        mock_client = Mock()
-        mock_bucket = Mock()
-        mock_blob = Mock()
-        mock_client.bucket.return_value = mock_bucket
-        mock_bucket.blob.return_value = mock_blob
-        mock_blob.upload_from_filename.side_effect = Exception("Upload failed")
+        mock_client, _, mock_blob = gcs_mocks
+        mock_blob.upload_from_file.side_effect = Exception("Upload failed")
         
         result = clickhouse_to_gcs.upload_to_gcs(
             mock_client, 'test-bucket', test_file, 'test/path.pdf'
@@ -1,258 +1,449 @@
 """
 Test cases for the PostgreSQL-based GCS Synchronizer
 """
-import unittest
 import os
-import tempfile
-import shutil
 import json
-from unittest.mock import Mock, patch, MagicMock
+import sqlite3
+import threading
+import time
 from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import ANY, Mock, patch
 import psycopg2
+import pytest
+from watchdog.events import FileCreatedEvent, FileModifiedEvent
 
 # Import the modules to test
 import clickhouse_to_gcs
 import config
+import scheduler
+import synchronizer
 
 
-class TestPostgreSQLConnection(unittest.TestCase):
+@pytest.fixture
+def upload_file(tmp_path):
+    """Create a file to upload"""
+    path = tmp_path / 'test.pdf'
+    path.write_text('Test content')
+    return str(path)
+
+
+@pytest.fixture
+def document_tree(tmp_path):
+    """Create a documents directory with a file in the root and one in a subdirectory"""
+    sub_dir = tmp_path / 'subdirectory'
+    sub_dir.mkdir()
+    test_file1 = tmp_path / 'test1.pdf'
+    test_file2 = sub_dir / 'test2.pdf'
+    test_file1.write_text('Test content 1')
+    test_file2.write_text('Test content 2')
+    return SimpleNamespace(root=str(tmp_path), sub_dir=str(sub_dir),
+                           test_file1=str(test_file1), test_file2=str(test_file2))
+
+
+@pytest.fixture
+def reports_dir(tmp_path):
+    """Point the reports directory at an empty temporary one"""
+    path = tmp_path / 'reports'
+    path.mkdir()
+    with patch('clickhouse_to_gcs.REPORTS_DIR', str(path)):
+        yield str(path)
+
+
+@pytest.fixture
+def sync_caches(tmp_path):
+    """Point the synchronizer's update-soon and processed caches at temporary files"""
+    caches = SimpleNamespace(update_soon=str(tmp_path / 'update-soon.log'),
+                             processed=str(tmp_path / 'processed.log'))
+    with patch('config.UPDATE_SOON_CACHE', caches.update_soon), \
+         patch('config.PROCESSED_FILES_LOG', caches.processed):
+        yield caches
+
+
+@pytest.fixture
+def watched_folder(tmp_path):
+    """Point the synchronizer's watched folder at an empty temporary one"""
+    path = tmp_path / 'watched'
+    path.mkdir()
+    with patch('config.WATCHED_FOLDER', str(path)), \
+         patch('synchronizer.WATCHED_PREFIX', os.path.join(str(path), '')):
+        yield str(path)
+
+
+def make_clickhouse_mock(unknown_paths=()):
+    """Return a ClickHouse client mock that knows every queried file_path except `unknown_paths`"""
+    mock_client = Mock()
+    mock_client.execute.side_effect = lambda query, params: [
+        (path,) for path in params['paths'] if path not in unknown_paths
+    ]
+    return mock_client
+
+
+class TestPostgreSQLConnection:
     """Test PostgreSQL connection functionality"""
-    
-    @patch('clickhouse_to_gcs.psycopg2.connect')
-    def test_postgres_connection_success(self, mock_connect):
+
+    def test_postgres_connection_success(self, mock_postgres_connection):
         """Test successful PostgreSQL connection"""
-        mock_conn = Mock()
-        mock_cursor = Mock()
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        mock_connect.return_value = mock_conn
-        
+        mock_conn, _ = mock_postgres_connection
+
         conn = clickhouse_to_gcs.get_postgres_connection()
-        
-        mock_connect.assert_called_once_with(
+
+        clickhouse_to_gcs.psycopg2.connect.assert_called_once_with(
             host=config.POSTGRES_HOST,
             port=config.POSTGRES_PORT,
             user=config.POSTGRES_USER,
             password=config.POSTGRES_PASSWORD,
-            dbname=config.POSTGRES_DB
+            dbname=config.POSTGRES_DB,
+            keepalives=1,
+            keepalives_idle=60,
+            keepalives_interval=10,
+            keepalives_count=5
         )
-        mock_cursor.execute.assert_called_once_with('SELECT 1')
-        self.assertEqual(conn, mock_conn)
-    
+        mock_conn.cursor.assert_not_called()
+        assert conn == mock_conn
+
     @patch('clickhouse_to_gcs.psycopg2.connect')
     def test_postgres_connection_failure(self, mock_connect):
         """Test PostgreSQL connection failure"""
         mock_connect.side_effect = psycopg2.Error("Connection failed")
-        
-        with self.assertRaises(psycopg2.Error):
+
+        with pytest.raises(psycopg2.Error):
             clickhouse_to_gcs.get_postgres_connection()
 
 
-class TestQueryPostgreSQL(unittest.TestCase):
+class TestQueryPostgreSQL:
     """Test PostgreSQL query functionality"""
-    
-    def test_query_postgres_success(self):
+
+    def test_query_postgres_success(self, mock_postgres_connection):
         """Test successful PostgreSQL query execution"""
-        mock_conn = Mock()
-        mock_cursor = Mock()
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
-        
+        mock_conn, mock_cursor = mock_postgres_connection
+
         # Mock query results
         mock_row1 = {'id': 1, 'name': 'Document 1'}
         mock_row2 = {'id': 2, 'name': 'Document 2'}
         mock_cursor.fetchall.return_value = [mock_row1, mock_row2]
-        
+
         query = "SELECT * FROM test_table"
         results = clickhouse_to_gcs.query_postgres(mock_conn, query)
-        
+
         mock_cursor.execute.assert_called_once_with(query, None)
-        self.assertEqual(len(results), 2)
-        self.assertEqual(results[0], mock_row1)
-        self.assertEqual(results[1], mock_row2)
-    
-    def test_query_postgres_with_params(self):
+        assert results == [mock_row1, mock_row2]
+
+    def test_query_postgres_with_params(self, mock_postgres_connection):
         """Test PostgreSQL query with parameters"""
-        mock_conn = Mock()
-        mock_cursor = Mock()
-        mock_conn.cursor.return_value.__enter__.return_value = mock_cursor
+        mock_conn, mock_cursor = mock_postgres_connection
         mock_cursor.fetchall.return_value = []
-        
+
         query = "SELECT * FROM test_table WHERE id = %(id)s"
         params = {'id': 1}
-        
+
         clickhouse_to_gcs.query_postgres(mock_conn, query, params)
-        
+
         mock_cursor.execute.assert_called_once_with(query, params)
 
 
-class TestGetDocumentsFromPostgreSQL(unittest.TestCase):
+class TestGetDocumentsFromPostgreSQL:
     """Test document retrieval from PostgreSQL"""
-    
+
     @patch('clickhouse_to_gcs.query_postgres')
     def test_get_documents_success(self, mock_query):
         """Test successful document retrieval"""
         mock_conn = Mock()
         mock_documents = [
             {
-                'id_base': 1,
-                'id_relasi': 1,
                 'id_dokumen': 123,
-                'kode_jenis_file': 'PDF',
-                'nomor': '001/2025',
-                'tahun': 2025,
-                'judul': 'Test Document',
-                'file': 'test.pdf',
-                'file_path': '/documents/test.pdf',
-                'link': 'http://example.com'
+                'file_path': '/documents/test.pdf'
             }
         ]
         mock_query.return_value = mock_documents
-        
+
         result = clickhouse_to_gcs.get_documents_from_postgres(mock_conn, limit=100)
-        
+
         expected_query = f"""
-    SELECT id_base, id_relasi, id_dokumen, kode_jenis_file, nomor, tahun,
-           judul, file, file_path, link
+    SELECT id_dokumen, file_path
     FROM {config.POSTGRES_SCHEMA}.{config.POSTGRES_VIEW}
     ORDER BY id_dokumen DESC
     LIMIT %(limit)s
     """
         mock_query.assert_called_once_with(mock_conn, expected_query, params={'limit': 100})
-        self.assertEqual(result, mock_documents)
-    
+        assert result == mock_documents
+
     @patch('clickhouse_to_gcs.query_postgres')
     def test_get_documents_empty_result(self, mock_query):
         """Test document retrieval with empty result"""
         mock_conn = Mock()
         mock_query.return_value = []
-        
+
         result = clickhouse_to_gcs.get_documents_from_postgres(mock_conn)
-        
-        self.assertEqual(result, [])
+
+        assert result == []
 
 
-class TestGCSClient(unittest.TestCase):
+class TestGCSClient:
     """Test GCS client functionality"""
-    
+
     @patch('clickhouse_to_gcs.storage.Client')
     @patch('clickhouse_to_gcs.service_account.Credentials.from_service_account_file')
-    def test_gcs_client_success(self, mock_credentials, mock_storage_client):
+    def test_gcs_client_success(self, mock_credentials, mock_storage_client, gcs_mocks):
         """Test successful GCS client creation"""
         mock_creds = Mock()
         mock_credentials.return_value = mock_creds
-        mock_client = Mock()
+        mock_client, _, _ = gcs_mocks
         mock_storage_client.return_value = mock_client
-        
+
         client = clickhouse_to_gcs.get_gcs_client()
-        
+
         mock_credentials.assert_called_once_with(config.GCS_SERVICE_ACCOUNT_KEY)
         mock_storage_client.assert_called_once_with(credentials=mock_creds)
-        mock_client.list_buckets.assert_called_once()
-        self.assertEqual(client, mock_client)
+        mock_client.bucket.assert_called_once_with(config.GCS_BUCKET_NAME)
+        mock_client.bucket.return_value.reload.assert_called_once()
+        mock_client.list_buckets.assert_not_called()
+        adapter = mock_client._http.mount.call_args[0][1]
+        assert adapter._pool_maxsize >= config.UPLOAD_WORKERS
+        assert client == mock_client
 
+    @patch('clickhouse_to_gcs.storage.Client')
+    @patch('clickhouse_to_gcs.service_account.Credentials.from_service_account_file')
+    def test_gcs_client_without_bucket_read_permission(self, mock_credentials, mock_storage_client, gcs_mocks):
+        """Test that a forbidden bucket metadata probe does not stop the client"""
+        mock_client, _, _ = gcs_mocks
+        mock_client.bucket.return_value.reload.side_effect = clickhouse_to_gcs.Forbidden("denied")
+        mock_storage_client.return_value = mock_client
+
+        client = clickhouse_to_gcs.get_gcs_client()
+
+        assert client == mock_client
 
-class TestUploadToGCS(unittest.TestCase):
+
+class TestUploadToGCS:
     """Test GCS upload functionality"""
-    
-    def setUp(self):
-        """Set up test environment"""
-        self.test_dir = tempfile.mkdtemp()
-        self.test_file = os.path.join(self.test_dir, 'test.pdf')
-        with open(self.test_file, 'w') as f:
-            f.write('Test content')
-    
-    def tearDown(self):
-        """Clean up test environment"""
-        shutil.rmtree(self.test_dir)
-    
-    def test_upload_success(self):
+
+    def test_upload_success(self, upload_file, gcs_mocks):
         """Test successful file upload"""
-        mock_client = Mock()
-        mock_bucket = Mock()
-        mock_blob = Mock()
-        mock_client.bucket.return_value = mock_bucket
-        mock_bucket.blob.return_value = mock_blob
-        
+        mock_client, mock_bucket, mock_blob = gcs_mocks
+
         result = clickhouse_to_gcs.upload_to_gcs(
-            mock_client, 'test-bucket', self.test_file, 'test/path.pdf'
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf'
         )
-        
-        self.assertTrue(result)
+
+        assert result is True
         mock_client.bucket.assert_called_once_with('test-bucket')
         mock_bucket.blob.assert_called_once_with('test/path.pdf')
-        mock_blob.upload_from_filename.assert_called_once_with(self.test_file)
-    
-    def test_upload_file_not_exists(self):
+        mock_blob.upload_from_file.assert_called_once_with(
+            ANY, size=os.path.getsize(upload_file), content_type='application/pdf', checksum='crc32c',
+            timeout=(clickhouse_to_gcs.UPLOAD_CONNECT_TIMEOUT, clickhouse_to_gcs.UPLOAD_TIMEOUT),
+            retry=clickhouse_to_gcs.DEFAULT_RETRY
+        )
+
+    def test_upload_with_shared_bucket(self, upload_file, gcs_mocks):
+        """Test that a shared bucket handle is used instead of a new one"""
+        mock_client, mock_bucket, _ = gcs_mocks
+
+        result = clickhouse_to_gcs.upload_to_gcs(
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf', bucket=mock_bucket
+        )
+
+        assert result is True
+        mock_client.bucket.assert_not_called()
+        mock_bucket.blob.return_value.upload_from_file.assert_called_once_with(
+            ANY, size=os.path.getsize(upload_file), content_type='application/pdf', checksum='crc32c',
+            timeout=(clickhouse_to_gcs.UPLOAD_CONNECT_TIMEOUT, clickhouse_to_gcs.UPLOAD_TIMEOUT),
+            retry=clickhouse_to_gcs.DEFAULT_RETRY
+        )
+
+    @patch('clickhouse_to_gcs.UPLOAD_CHUNK_SIZE_MB', 8)
+    def test_upload_with_configured_chunk_size(self, upload_file, gcs_mocks):
+        """Test that a configured chunk size is applied to the blob"""
+        mock_client, mock_bucket, _ = gcs_mocks
+
+        result = clickhouse_to_gcs.upload_to_gcs(
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf', bucket=mock_bucket
+        )
+
+        assert result is True
+        assert mock_bucket.blob.return_value.chunk_size == 8 * 1024 * 1024
+
+    def test_upload_skips_unchanged_object(self, upload_file, gcs_mocks):
+        """Test that an identical existing object is not uploaded again"""
+        mock_client, mock_bucket, _ = gcs_mocks
+        mock_bucket.get_blob.return_value.size = os.path.getsize(upload_file)
+        mock_bucket.get_blob.return_value.md5_hash = clickhouse_to_gcs.local_file_md5(upload_file)
+
+        result = clickhouse_to_gcs.upload_to_gcs(
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf',
+            bucket=mock_bucket, skip_unchanged=True
+        )
+
+        assert result == clickhouse_to_gcs.UPLOAD_UNCHANGED
+        mock_bucket.get_blob.assert_called_once_with('test/path.pdf')
+        mock_bucket.blob.assert_not_called()
+
+    def test_upload_replaces_changed_object(self, upload_file, gcs_mocks):
+        """Test that an existing object with different content is uploaded"""
+        mock_client, mock_bucket, _ = gcs_mocks
+        mock_bucket.get_blob.return_value.size = os.path.getsize(upload_file)
+        mock_bucket.get_blob.return_value.md5_hash = 'different'
+
+        result = clickhouse_to_gcs.upload_to_gcs(
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf',
+            bucket=mock_bucket, skip_unchanged=True
+        )
+
+        assert result is True
+        mock_bucket.blob.return_value.upload_from_file.assert_called_once()
+
+    def test_upload_without_permission_to_read_metadata(self, upload_file, gcs_mocks):
+        """Test that upload-only accounts upload when the unchanged check is refused"""
+        mock_client, mock_bucket, _ = gcs_mocks
+        mock_bucket.get_blob.side_effect = clickhouse_to_gcs.Forbidden('storage.objects.get denied')
+
+        result = clickhouse_to_gcs.upload_to_gcs(
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf',
+            bucket=mock_bucket, skip_unchanged=True
+        )
+
+        assert result is True
+        mock_bucket.blob.assert_called_once_with('test/path.pdf')
+        mock_bucket.blob.return_value.upload_from_file.assert_called_once()
+
+    def test_upload_skips_object_listed_unchanged(self, upload_file, gcs_mocks):
+        """Test that a bucket listing replaces the per-object metadata request"""
+        mock_client, mock_bucket, _ = gcs_mocks
+        listed = Mock(size=os.path.getsize(upload_file), md5_hash=clickhouse_to_gcs.local_file_md5(upload_file))
+        listed.name = 'test/path.pdf'
+        mock_bucket.list_blobs.return_value = [listed]
+
+        remote_objects = clickhouse_to_gcs.list_remote_objects(mock_bucket, 'test/')
+        result = clickhouse_to_gcs.upload_to_gcs(
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf',
+            bucket=mock_bucket, skip_unchanged=True, remote_objects=remote_objects
+        )
+
+        assert result == clickhouse_to_gcs.UPLOAD_UNCHANGED
+        assert mock_bucket.list_blobs.call_args[1]['prefix'] == 'test/'
+        mock_bucket.get_blob.assert_not_called()
+        mock_bucket.blob.assert_not_called()
+
+    def test_resumable_chunk_size(self):
+        """Test chunk sizes picked from the file size"""
+        assert clickhouse_to_gcs.resumable_chunk_size(1024 * 1024) is None
+        assert clickhouse_to_gcs.resumable_chunk_size(9 * 1024 * 1024 + 1) == 9 * 1024 * 1024 + 256 * 1024
+        assert clickhouse_to_gcs.resumable_chunk_size(30 * 1024 * 1024) == 16 * 1024 * 1024
+
+    @patch('clickhouse_to_gcs.PARALLEL_UPLOAD_THRESHOLD_MB', 0)
+    @patch('clickhouse_to_gcs.transfer_manager.upload_chunks_concurrently')
+    def test_upload_large_file_in_chunks(self, mock_upload_chunks, upload_file, gcs_mocks):
+        """Test that files above the threshold are uploaded in parallel chunks"""
+        mock_client, mock_bucket, mock_blob = gcs_mocks
+
+        result = clickhouse_to_gcs.upload_to_gcs(
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf'
+        )
+
+        assert result is True
+        mock_upload_chunks.assert_called_once()
+        assert mock_upload_chunks.call_args[0] == (upload_file, mock_blob)
+        mock_blob.upload_from_file.assert_not_called()
+
+    def test_upload_file_not_exists(self, gcs_mocks):
         """Test upload with non-existent file"""
-        mock_client = Mock()
-        
+        mock_client, _, _ = gcs_mocks
+
         result = clickhouse_to_gcs.upload_to_gcs(
             mock_client, 'test-bucket', '/nonexistent/file.pdf', 'test/path.pdf'
         )
-        
-        self.assertFalse(result)
-    
-    def test_upload_gcs_error(self):
+
+        assert result is False
+
+    def test_upload_gcs_error(self, upload_file, gcs_mocks):
         """Test upload with GCS error"""
-        mock_client = Mock()
-        mock_bucket = Mock()
-        mock_blob = Mock()
-        mock_client.bucket.return_value = mock_bucket
-        mock_bucket.blob.return_value = mock_blob
-        mock_blob.upload_from_filename.side_effect = Exception("Upload failed")
-        
+        mock_client, mock_bucket, mock_blob = gcs_mocks
+        mock_blob.upload_from_file.side_effect = Exception("Upload failed")
+
         result = clickhouse_to_gcs.upload_to_gcs(
-            mock_client, 'test-bucket', self.test_file, 'test/path.pdf'
+            mock_client, 'test-bucket', upload_file, 'test/path.pdf'
         )
-        
-        self.assertFalse(result)
 
+        assert result is False
 
-class TestFindLocalFile(unittest.TestCase):
+
+class TestFindLocalFile:
     """Test local file search functionality"""
-    
-    def setUp(self):
-        """Set up test environment with directory structure"""
-        self.test_dir = tempfile.mkdtemp()
-        self.sub_dir = os.path.join(self.test_dir, 'subdirectory')
-        os.makedirs(self.sub_dir)
-        
-        # Create test files
-        self.test_file1 = os.path.join(self.test_dir, 'test1.pdf')
-        self.test_file2 = os.path.join(self.sub_dir, 'test2.pdf')
-        
-        with open(self.test_file1, 'w') as f:
-            f.write('Test content 1')
-        with open(self.test_file2, 'w') as f:
-            f.write('Test content 2')
-    
-    def tearDown(self):
-        """Clean up test environment"""
-        shutil.rmtree(self.test_dir)
-    
-    def test_find_file_in_root(self):
+
+    def test_find_file_in_root(self, document_tree):
         """Test finding file in root directory"""
-        result = clickhouse_to_gcs.find_local_file('test1.pdf', self.test_dir)
-        self.assertEqual(result, os.path.abspath(self.test_file1))
-    
-    def test_find_file_in_subdirectory(self):
+        result = clickhouse_to_gcs.find_local_file('test1.pdf', document_tree.root)
+        assert result == os.path.abspath(document_tree.test_file1)
+
+    def test_find_file_in_subdirectory(self, document_tree):
         """Test finding file in subdirectory"""
-        result = clickhouse_to_gcs.find_local_file('test2.pdf', self.test_dir)
-        self.assertEqual(result, os.path.abspath(self.test_file2))
-    
-    def test_find_file_not_found(self):
+        result = clickhouse_to_gcs.find_local_file('test2.pdf', document_tree.root)
+        assert result == os.path.abspath(document_tree.test_file2)
+
+    def test_find_file_not_found(self, document_tree):
         """Test file not found"""
-        result = clickhouse_to_gcs.find_local_file('nonexistent.pdf', self.test_dir)
-        self.assertIsNone(result)
-    
-    def test_find_file_empty_filename(self):
+        result = clickhouse_to_gcs.find_local_file('nonexistent.pdf', document_tree.root)
+        assert result is None
+
+    def test_find_file_empty_filename(self, document_tree):
         """Test with empty filename"""
-        result = clickhouse_to_gcs.find_local_file('', self.test_dir)
-        self.assertIsNone(result)
+        result = clickhouse_to_gcs.find_local_file('', document_tree.root)
+        assert result is None
+
+    def test_find_file_by_relative_path(self, document_tree):
+        """Test that a path relative to the root picks that file over same-named ones"""
+        duplicate = os.path.join(document_tree.sub_dir, 'test1.pdf')
+        with open(duplicate, 'w') as f:
+            f.write('Duplicate content')
+
+        index = clickhouse_to_gcs.build_file_index(document_tree.root)
+        result = clickhouse_to_gcs.find_local_file('/subdirectory/test1.pdf', document_tree.root, index)
+        assert result == os.path.abspath(duplicate)
+
+    def test_build_file_index(self, document_tree):
+        """Test indexing files across the directory tree"""
+        index = clickhouse_to_gcs.build_file_index(document_tree.root)
+        assert index == {
+            'test1.pdf': [(os.path.abspath(document_tree.test_file1), 'test1.pdf')],
+            'test2.pdf': [(os.path.abspath(document_tree.test_file2), 'subdirectory/test2.pdf')],
+        }
+
+    def test_locate_file_relative_path(self, document_tree):
+        """Test that the located file comes with its '/'-separated relative path"""
+        expected = (os.path.abspath(document_tree.test_file2), 'subdirectory/test2.pdf')
+        index = clickhouse_to_gcs.build_file_index(document_tree.root)
+        for file_index in (index, None):
+            result = clickhouse_to_gcs.locate_local_file('/documents/test2.pdf', document_tree.root, file_index)
+            assert result == expected
+        result = clickhouse_to_gcs.locate_local_file('subdirectory/test2.pdf', document_tree.root)
+        assert result == expected
+
+    def test_find_file_with_index(self, document_tree):
+        """Test finding files through a prebuilt index"""
+        index = clickhouse_to_gcs.build_file_index(document_tree.root)
+        result = clickhouse_to_gcs.find_local_file('/documents/test2.pdf', document_tree.root, index)
+        assert result == os.path.abspath(document_tree.test_file2)
+        assert clickhouse_to_gcs.find_local_file('nonexistent.pdf', document_tree.root, index) is None
+
+    def test_find_file_with_index_prefers_shallowest_duplicate(self, document_tree):
+        """Test that the index resolves duplicate filenames to the shallowest path"""
+        nested_dir = os.path.join(document_tree.sub_dir, 'a')
+        os.makedirs(nested_dir)
+        for directory in (nested_dir, document_tree.root):
+            with open(os.path.join(directory, 'test2.pdf'), 'w') as f:
+                f.write('Duplicate content')
+
+        index = clickhouse_to_gcs.build_file_index(document_tree.root)
+        assert [relative for _, relative in index['test2.pdf']] == [
+            'test2.pdf', 'subdirectory/test2.pdf', 'subdirectory/a/test2.pdf'
+        ]
+        result = clickhouse_to_gcs.find_local_file('/other/test2.pdf', document_tree.root, index)
+        assert result == os.path.abspath(os.path.join(document_tree.root, 'test2.pdf'))
 
 
-class TestFilterUnprocessedDocuments(unittest.TestCase):
+class TestFilterUnprocessedDocuments:
     """Test document filtering functionality"""
-    
+
     def test_filter_documents(self):
         """Test filtering unprocessed documents"""
         documents = [
@@ -261,36 +452,22 @@ class TestFilterUnprocessedDocuments(unittest.TestCase):
             {'id_dokumen': 3, 'title': 'Doc 3'},
         ]
         processed_cache = {'1', '3'}  # Documents 1 and 3 already processed
-        
+
         unprocessed, stats = clickhouse_to_gcs.filter_unprocessed_documents(
             documents, processed_cache
         )
-        
-        self.assertEqual(len(unprocessed), 1)
-        self.assertEqual(unprocessed[0]['id_dokumen'], 2)
-        self.assertEqual(stats['total_documents'], 3)
-        self.assertEqual(stats['already_processed'], 2)
-        self.assertEqual(stats['to_process'], 1)
 
+        assert [doc['id_dokumen'] for doc in unprocessed] == [2]
+        assert stats['total_documents'] == 3
+        assert stats['already_processed'] == 2
+        assert stats['to_process'] == 1
 
-class TestProcessingReport(unittest.TestCase):
+
+class TestProcessingReport:
     """Test processing report functionality"""
-    
-    def setUp(self):
-        """Set up test environment"""
-        self.test_dir = tempfile.mkdtemp()
-        self.reports_dir = os.path.join(self.test_dir, 'reports')
-        os.makedirs(self.reports_dir)
-    
-    def tearDown(self):
-        """Clean up test environment"""
-        shutil.rmtree(self.test_dir)
-    
-    @patch('clickhouse_to_gcs.os.path.dirname')
-    def test_save_processing_report(self, mock_dirname):
+
+    def test_save_processing_report(self, reports_dir):
         """Test saving processing report"""
-        mock_dirname.return_value = self.test_dir
-        
         stats = {
             'total_documents': 10,
             'processed': 5,
@@ -301,26 +478,23 @@ class TestProcessingReport(unittest.TestCase):
                 {'id_dokumen': 2, 'file_path': '/test/file2.pdf'}
             ]
         }
-        
+
         result_path = clickhouse_to_gcs.save_processing_report(stats)
-        
-        expected_path = os.path.join(self.reports_dir, 'sync_report.json')
-        self.assertEqual(result_path, expected_path)
-        self.assertTrue(os.path.exists(expected_path))
-        
+
+        expected_path = os.path.join(reports_dir, 'sync_report.json')
+        assert result_path == expected_path
+        assert os.path.exists(expected_path)
+
         # Verify content
         with open(expected_path, 'r') as f:
             saved_data = json.load(f)
-        
-        self.assertEqual(saved_data['total_documents'], 10)
-        self.assertEqual(saved_data['processed'], 5)
-        self.assertEqual(len(saved_data['processed_files']), 2)
-    
-    @patch('clickhouse_to_gcs.os.path.dirname')
-    def test_load_processed_cache(self, mock_dirname):
+
+        assert saved_data['total_documents'] == 10
+        assert saved_data['processed'] == 5
+        assert len(saved_data['processed_files']) == 2
+
+    def test_load_processed_cache(self, reports_dir):
         """Test loading processed cache from report"""
-        mock_dirname.return_value = self.test_dir
-        
         # Create a test report
         report_data = {
             'processed_files': [
@@ -329,31 +503,75 @@ class TestProcessingReport(unittest.TestCase):
                 {'id_dokumen': '3', 'file_path': '/test/file3.pdf'}  # String ID
             ]
         }
-        
-        report_path = os.path.join(self.reports_dir, 'sync_report.json')
+
+        report_path = os.path.join(reports_dir, 'sync_report.json')
         with open(report_path, 'w') as f:
             json.dump(report_data, f)
-        
+
         cache = clickhouse_to_gcs.load_processed_cache()
-        
-        expected_cache = {'1', '2', '3'}
-        self.assertEqual(cache, expected_cache)
 
+        assert cache == {'1', '2', '3'}
 
-class TestMainFunction(unittest.TestCase):
+    def test_load_processed_cache_from_store(self, reports_dir):
+        """Test that saved reports are recorded in the SQLite store and read back"""
+        stats = {
+            'processed_files': [
+                {'id_dokumen': 7, 'local_path': '/test/file7.pdf', 'gcs_path': 'documents/main/file7.pdf'}
+            ]
+        }
+        clickhouse_to_gcs.save_processing_report(stats)
+        os.remove(os.path.join(reports_dir, 'sync_report.json'))
+
+        assert os.path.exists(os.path.join(reports_dir, 'processed.db'))
+        assert clickhouse_to_gcs.load_processed_cache() == {'7'}
+        records = clickhouse_to_gcs.load_processed_records(reports_dir)
+        assert records['7']['local_path'] == '/test/file7.pdf'
+
+    def test_load_processed_cache_reuses_store_until_written(self, reports_dir):
+        """Test that the processed store is only re-read after it changes"""
+        clickhouse_to_gcs._read_processed_ids.cache_clear()
+        clickhouse_to_gcs.record_processed_files([{'id_dokumen': 1}], reports_dir)
+
+        with patch('clickhouse_to_gcs.open_processed_db',
+                   wraps=clickhouse_to_gcs.open_processed_db) as mock_open:
+            assert clickhouse_to_gcs.load_processed_cache() == {'1'}
+            assert clickhouse_to_gcs.load_processed_cache() == {'1'}
+            assert mock_open.call_count == 1
+
+            clickhouse_to_gcs.record_processed_files([{'id_dokumen': 2}], reports_dir)
+            assert clickhouse_to_gcs.load_processed_cache() == {'1', '2'}
+
+    def test_load_processed_cache_sees_write_with_same_size_and_mtime(self, reports_dir):
+        """Test that another process's write is seen even when the store's size and mtime are unchanged"""
+        clickhouse_to_gcs.record_processed_files([{'id_dokumen': 1}], reports_dir)
+        db_path = os.path.join(reports_dir, 'processed.db')
+        assert clickhouse_to_gcs.load_processed_cache() == {'1'}
+        st = os.stat(db_path)
+
+        # A write from another process, fitting in a free page slot within one mtime tick
+        conn = sqlite3.connect(db_path)
+        with conn:
+            conn.execute("INSERT OR REPLACE INTO processed (id_dokumen) VALUES ('2')")
+        conn.close()
+        os.utime(db_path, ns=(st.st_atime_ns, st.st_mtime_ns))
+        assert os.path.getsize(db_path) == st.st_size
+
+        assert clickhouse_to_gcs.load_processed_cache() == {'1', '2'}
+
+
+class TestMainFunction:
     """Test main function integration"""
-    
+
     @patch('clickhouse_to_gcs.get_postgres_connection')
     @patch('clickhouse_to_gcs.get_gcs_client')
     @patch('clickhouse_to_gcs.get_documents_from_postgres')
     @patch('clickhouse_to_gcs.load_processed_cache')
-    @patch('clickhouse_to_gcs.filter_unprocessed_documents')
     @patch('clickhouse_to_gcs.process_documents')
     @patch('clickhouse_to_gcs.save_processing_report')
     @patch('clickhouse_to_gcs.os.makedirs')
-    def test_main_function_success(self, mock_makedirs, mock_save_report, 
-                                 mock_process_docs, mock_filter_docs, 
-                                 mock_load_cache, mock_get_docs, 
+    def test_main_function_success(self, mock_makedirs, mock_save_report,
+                                 mock_process_docs,
+                                 mock_load_cache, mock_get_docs,
                                  mock_gcs_client, mock_pg_conn):
         """Test successful execution of main function"""
         # Setup mocks
@@ -361,77 +579,509 @@ class TestMainFunction(unittest.TestCase):
         mock_pg_conn.return_value = mock_conn
         mock_client = Mock()
         mock_gcs_client.return_value = mock_client
-        
+
         mock_documents = [{'id_dokumen': 1, 'file_path': '/test/file1.pdf'}]
         mock_get_docs.return_value = mock_documents
-        
+
         mock_cache = set()
         mock_load_cache.return_value = mock_cache
-        
-        mock_filter_stats = {'already_processed': 0, 'to_process': 1}
-        mock_filter_docs.return_value = (mock_documents, mock_filter_stats)
-        
+
         mock_process_stats = {'processed': 1, 'processed_files': []}
-        mock_process_docs.return_value = mock_process_stats
-        
+        # Consume the streamed documents like process_documents does
+        mock_process_docs.side_effect = lambda docs, *args, **kwargs: (list(docs), mock_process_stats)[1]
+
         mock_save_report.return_value = '/test/report.json'
-        
+
         # Execute main function
         clickhouse_to_gcs.main()
-        
+
         # Verify calls
         mock_pg_conn.assert_called_once()
         mock_gcs_client.assert_called_once()
-        mock_get_docs.assert_called_once_with(mock_conn)
+        mock_get_docs.assert_called_once_with(mock_conn, exclude_ids=mock_cache, shard=None, stream=True)
         mock_load_cache.assert_called_once()
-        mock_filter_docs.assert_called_once_with(mock_documents, mock_cache)
         mock_process_docs.assert_called_once()
         mock_save_report.assert_called_once()
         mock_conn.close.assert_called_once()
 
 
-class TestConfigModule(unittest.TestCase):
+class TestConfigModule:
     """Test configuration module"""
-    
+
     def test_postgres_config_values(self):
         """Test PostgreSQL configuration values"""
-        self.assertEqual(config.POSTGRES_HOST, 'localhost')
-        self.assertEqual(config.POSTGRES_PORT, 5432)
-        self.assertEqual(config.POSTGRES_USER, 'pmendika')
-        self.assertEqual(config.POSTGRES_PASSWORD, 'AppPm3n2025')
-        self.assertEqual(config.POSTGRES_DB, 'pmen')
-        self.assertEqual(config.POSTGRES_SCHEMA, 'transaksi')
-        self.assertEqual(config.POSTGRES_VIEW, 'v_dokumen')
+        assert config.POSTGRES_HOST == 'localhost'
+        assert config.POSTGRES_PORT == 5432
+        assert config.POSTGRES_USER == 'pmendika'
+        assert config.POSTGRES_PASSWORD == 'AppPm3n2025'
+        assert config.POSTGRES_DB == 'pmen'
+        assert config.POSTGRES_SCHEMA == 'transaksi'
+        assert config.POSTGRES_VIEW == 'v_dokumen'
+
+
+class TestProcessPendingFiles:
+    """Test the legacy synchronizer's processing of the update-soon cache"""
+
+    def test_process_pending_files_uploads_concurrently(self, sync_caches, watched_folder, gcs_mocks):
+        """Test that pending files are uploaded on the pool and only failures stay pending"""
+        mock_client, mock_bucket, _ = gcs_mocks
+        pending = []
+        for name in ('a.pdf', 'b.pdf', 'c.pdf'):
+            path = os.path.join(watched_folder, name)
+            with open(path, 'w') as f:
+                f.write(name)
+            pending.append(path)
+        synchronizer.write_cache(pending, sync_caches.update_soon)
+        upload_threads = set()
+
+        def upload(blob, file_path, size):
+            upload_threads.add(threading.current_thread().name)
+            if file_path.endswith('b.pdf'):
+                raise OSError('connection reset')
+
+        with patch('synchronizer.get_gcs_client', return_value=mock_client), \
+             patch('synchronizer.get_clickhouse_client', return_value=make_clickhouse_mock()), \
+             patch('synchronizer.upload_file', side_effect=upload) as mock_upload:
+            synchronizer.process_pending_files()
+
+        assert mock_upload.call_count == 3
+        assert threading.main_thread().name not in upload_threads
+        assert sorted(args[0] for args in mock_bucket.blob.call_args_list) == [
+            ('a.pdf',), ('b.pdf',), ('c.pdf',)
+        ]
+        assert synchronizer.read_cache(sync_caches.update_soon) == [pending[1]]
+        processed = synchronizer.CacheSet(sync_caches.processed).load()
+        assert processed.contains(pending[0]) and processed.contains(pending[2])
+        assert not processed.contains(pending[1])
+
+
+class TestCacheSet:
+    """Test the synchronizer's processed-files cache"""
+
+    def read_lines(self, path):
+        with open(path) as f:
+            return f.read().splitlines()
+
+    def test_cache_set_appends_new_paths(self, tmp_path):
+        """Test that each new path is appended as one NDJSON line as soon as it is added"""
+        cache_file = str(tmp_path / 'processed.log')
+        cache = synchronizer.CacheSet(cache_file).load()
+
+        cache.add('/docs/a.pdf')
+        cache.add('/docs/b.pdf')
+        cache.add('/docs/a.pdf')
+
+        # Written through before compact(), so a crash loses no recorded upload
+        assert self.read_lines(cache_file) == ['"/docs/a.pdf"', '"/docs/b.pdf"']
+        reloaded = synchronizer.CacheSet(cache_file).load()
+        assert reloaded.contains('/docs/a.pdf') and reloaded.contains('/docs/b.pdf')
+        assert not reloaded.contains('/docs/c.pdf')
+        cache.compact()
+        assert self.read_lines(cache_file) == ['"/docs/a.pdf"', '"/docs/b.pdf"']
+
+    def test_cache_set_compacts_duplicate_lines(self, tmp_path):
+        """Test that compact() rewrites the file only once duplicates exceed the unique entries"""
+        cache_file = str(tmp_path / 'processed.log')
+        with open(cache_file, 'w') as f:
+            f.write('"/docs/b.pdf"\n' + '"/docs/a.pdf"\n' * 3)
+
+        # Four lines for two paths is not more than twice the unique entries
+        synchronizer.CacheSet(cache_file).load().compact()
+        assert len(self.read_lines(cache_file)) == 4
+
+        with open(cache_file, 'a') as f:
+            f.write('"/docs/a.pdf"\n')
+        synchronizer.CacheSet(cache_file).load().compact()
+        assert self.read_lines(cache_file) == ['"/docs/a.pdf"', '"/docs/b.pdf"']
+
+    def test_cache_set_rewrite_keeps_old_file_on_failure(self, tmp_path):
+        """Test that a compaction interrupted before the replace leaves the old file intact"""
+        cache_file = str(tmp_path / 'processed.log')
+        original = '"/docs/a.pdf"\n' * 3
+        with open(cache_file, 'w') as f:
+            f.write(original)
+
+        cache = synchronizer.CacheSet(cache_file).load()
+        with patch('synchronizer.os.replace', side_effect=OSError('disk full')):
+            with pytest.raises(OSError):
+                cache.compact()
+
+        with open(cache_file) as f:
+            assert f.read() == original
+
+    @pytest.mark.parametrize('indent', [None, 4])
+    def test_cache_set_converts_legacy_json_list(self, tmp_path, indent):
+        """Test that a cache in the older JSON list format is loaded and rewritten as NDJSON"""
+        cache_file = str(tmp_path / 'processed.log')
+        with open(cache_file, 'w') as f:
+            json.dump(['/docs/b.pdf', '/docs/a.pdf', '/docs/b.pdf'], f, indent=indent)
+
+        cache = synchronizer.CacheSet(cache_file).load()
+
+        assert cache.contains('/docs/a.pdf') and cache.contains('/docs/b.pdf')
+        assert self.read_lines(cache_file) == ['"/docs/a.pdf"', '"/docs/b.pdf"']
+        cache.add('/docs/c.pdf')
+        cache.compact()
+        reloaded = synchronizer.CacheSet(cache_file).load()
+        assert all(reloaded.contains(f'/docs/{name}.pdf') for name in 'abc')
+
+    def test_cache_set_tolerates_partly_written_last_line(self, tmp_path):
+        """Test that a line cut short by a crash is skipped and not merged with the next append"""
+        cache_file = str(tmp_path / 'processed.log')
+        with open(cache_file, 'w') as f:
+            f.write('"/docs/a.pdf"\n"/docs/b.pdf"\n"/docs/c.p')
+
+        cache = synchronizer.CacheSet(cache_file).load()
+        assert cache.contains('/docs/a.pdf') and cache.contains('/docs/b.pdf')
+        assert not cache.contains('/docs/c.pdf')
+
+        cache.add('/docs/d.pdf')
+        cache.compact()
+        reloaded = synchronizer.CacheSet(cache_file).load()
+        assert reloaded.contains('/docs/d.pdf')
+        assert self.read_lines(cache_file)[-1] == '"/docs/d.pdf"'
+
+    def test_write_cache_replaces_file_atomically(self, tmp_path):
+        """Test that the JSON cache is replaced whole, and kept when a write fails"""
+        cache_file = str(tmp_path / 'update-soon.log')
+        synchronizer.write_cache(['/docs/a.pdf'], cache_file)
+
+        with patch('synchronizer.json.dump', side_effect=OSError('disk full')):
+            with pytest.raises(OSError):
+                synchronizer.write_cache(['/docs/a.pdf', '/docs/b.pdf'], cache_file)
+        assert synchronizer.read_cache(cache_file) == ['/docs/a.pdf']
+
+        synchronizer.write_cache(['/docs/b.pdf'], cache_file)
+        assert synchronizer.read_cache(cache_file) == ['/docs/b.pdf']
+        assert os.listdir(tmp_path) == ['update-soon.log']
+
+
+class TestClickHouseValidation:
+    """Test validation of pending files against ClickHouse"""
+
+    def test_get_db_filepaths_success(self, watched_folder):
+        """Test that a batch is validated in one query on relative paths"""
+        local_paths = [os.path.join(watched_folder, 'sub', 'a.pdf'), os.path.join(watched_folder, 'b.pdf')]
+        mock_client = make_clickhouse_mock(unknown_paths={'b.pdf'})
+
+        result = synchronizer.get_db_filepaths(local_paths, mock_client)
+
+        assert result == {'sub/a.pdf'}
+        mock_client.execute.assert_called_once()
+        assert sorted(mock_client.execute.call_args[0][1]['paths']) == ['b.pdf', 'sub/a.pdf']
+
+    def test_get_db_filepaths_error(self, watched_folder):
+        """Test that a failed query is reported as None rather than as no known files"""
+        mock_client = Mock()
+        mock_client.execute.side_effect = ConnectionError('ClickHouse unavailable')
+
+        result = synchronizer.get_db_filepaths([os.path.join(watched_folder, 'a.pdf')], mock_client)
+
+        assert result is None
+
+    def test_failed_validation_keeps_batch_pending(self, sync_caches, watched_folder):
+        """Test that files are neither uploaded nor dropped when ClickHouse cannot be queried"""
+        path = os.path.join(watched_folder, 'a.pdf')
+        with open(path, 'w') as f:
+            f.write('content')
+        synchronizer.write_cache([path], sync_caches.update_soon)
+        mock_client = Mock()
+        mock_client.execute.side_effect = ConnectionError('ClickHouse unavailable')
+        processed = synchronizer.CacheSet(sync_caches.processed).load()
+
+        with patch('synchronizer.upload_file') as mock_upload:
+            synchronizer._process_pending_files([path], processed, mock_client, Mock())
+
+        mock_upload.assert_not_called()
+        assert synchronizer.read_cache(sync_caches.update_soon) == [path]
+
+
+class TestValidatedUploads:
+    """Test the stat, validate and upload pipeline for pending files"""
+
+    def make_files(self, watched_folder, count):
+        paths = []
+        for i in range(count):
+            path = os.path.join(watched_folder, f'doc_{i}.pdf')
+            with open(path, 'w') as f:
+                f.write('x' * i)
+            paths.append(path)
+        return paths
+
+    def test_validated_uploads_in_batches_and_order(self, watched_folder):
+        """Test that files are validated per batch and yielded in their original order"""
+        paths = self.make_files(watched_folder, 5)
+        mock_client = make_clickhouse_mock(unknown_paths={'doc_3.pdf'})
+        rejected = set()
+
+        with patch('synchronizer.VALIDATION_BATCH_SIZE', 2):
+            uploads = list(synchronizer._validated_uploads(paths, mock_client, rejected))
+
+        assert [sorted(args[0][1]['paths']) for args in mock_client.execute.call_args_list] == [
+            ['doc_0.pdf', 'doc_1.pdf'], ['doc_2.pdf', 'doc_3.pdf'], ['doc_4.pdf']
+        ]
+        assert uploads == [
+            (paths[0], 'doc_0.pdf', 0), (paths[1], 'doc_1.pdf', 1),
+            (paths[2], 'doc_2.pdf', 2), (paths[4], 'doc_4.pdf', 4)
+        ]
+        assert rejected == {paths[3]}
+
+    def test_validated_uploads_exclude_failed_stats(self, watched_folder):
+        """Test that files failing the stat are rejected without being validated"""
+        paths = self.make_files(watched_folder, 2)
+        missing = os.path.join(watched_folder, 'missing.pdf')
+        mock_client = make_clickhouse_mock()
+        rejected = set()
+
+        uploads = list(synchronizer._validated_uploads([paths[0], missing, paths[1]], mock_client, rejected))
+
+        assert [upload[0] for upload in uploads] == paths
+        assert rejected == {missing}
+        assert sorted(mock_client.execute.call_args[0][1]['paths']) == ['doc_0.pdf', 'doc_1.pdf']
+
+    def test_cache_append_only_on_successful_upload(self, sync_caches, watched_folder):
+        """Test that only uploaded files are appended to the processed cache"""
+        paths = self.make_files(watched_folder, 3)
+        processed = synchronizer.CacheSet(sync_caches.processed).load()
+
+        def upload(blob, file_path, size):
+            if file_path == paths[1]:
+                raise OSError('connection reset')
+
+        with patch('synchronizer.upload_file', side_effect=upload):
+            synchronizer._process_pending_files(paths, processed, make_clickhouse_mock(), Mock())
+        processed.compact()
+
+        with open(sync_caches.processed) as f:
+            assert sorted(json.loads(line) for line in f) == [paths[0], paths[2]]
+        assert synchronizer.read_cache(sync_caches.update_soon) == [paths[1]]
+
+
+class TestPendingFileChecks:
+    """Test the existence and name checks applied to pending files"""
+
+    def test_get_file_size(self, tmp_path):
+        """Test that only regular files have a size"""
+        path = tmp_path / 'a.pdf'
+        path.write_text('content')
+
+        assert synchronizer.get_file_size(str(path)) == 7
+        assert synchronizer.get_file_size(str(tmp_path / 'missing.pdf')) is None
+        assert synchronizer.get_file_size(str(tmp_path)) is None
+
+    def test_processed_files_are_not_stated(self, sync_caches, watched_folder):
+        """Test that files already in the processed cache are skipped before the stat pool"""
+        done, new = os.path.join(watched_folder, 'done.pdf'), os.path.join(watched_folder, 'new.pdf')
+        processed = synchronizer.CacheSet(sync_caches.processed).load()
+        processed.add(done)
+
+        with patch('synchronizer.get_file_size', return_value=None) as mock_size:
+            synchronizer._process_pending_files([done, new], processed, make_clickhouse_mock(), Mock())
+        processed.compact()
+
+        mock_size.assert_called_once_with(new)
+        assert synchronizer.read_cache(sync_caches.update_soon) == []
+
+    def test_get_relative_path(self, watched_folder):
+        """Test that relative paths are sliced off the watched-folder prefix"""
+        assert synchronizer.get_relative_path(os.path.join(watched_folder, 'a.pdf')) == 'a.pdf'
+        assert synchronizer.get_relative_path(
+            os.path.join(watched_folder, 'sub', 'dir', 'a.pdf')) == 'sub/dir/a.pdf'
+        # A sibling folder sharing the name as a prefix is not below the watched folder
+        assert synchronizer.get_relative_path(watched_folder + '2' + os.sep + 'a.pdf') == '../watched2/a.pdf'
+
+
+class TestSynchronizerUpload:
+    """Test the legacy synchronizer's file uploads"""
+
+    def test_upload_file_from_handle_with_known_size(self, upload_file, gcs_mocks):
+        """Test that small files are uploaded from an open handle with the pre-stat'ed size"""
+        _, _, mock_blob = gcs_mocks
+        size = os.path.getsize(upload_file)
+
+        with patch('synchronizer.transfer_manager.upload_chunks_concurrently') as mock_chunks:
+            synchronizer.upload_file(mock_blob, upload_file, size)
+
+        mock_chunks.assert_not_called()
+        mock_blob.upload_from_file.assert_called_once_with(
+            ANY, size=size, content_type='application/pdf', retry=synchronizer.DEFAULT_RETRY
+        )
+        file_obj = mock_blob.upload_from_file.call_args[0][0]
+        assert file_obj.name == upload_file and file_obj.closed
+
+    def test_upload_large_file_in_parallel_chunks(self, upload_file, gcs_mocks):
+        """Test that files above the threshold are uploaded as concurrent chunks"""
+        _, _, mock_blob = gcs_mocks
+        size = config.PARALLEL_UPLOAD_THRESHOLD_MB * 1024 * 1024 + 1
+
+        with patch('synchronizer.transfer_manager.upload_chunks_concurrently') as mock_chunks:
+            synchronizer.upload_file(mock_blob, upload_file, size)
+
+        mock_chunks.assert_called_once_with(
+            upload_file, mock_blob,
+            chunk_size=config.PARALLEL_UPLOAD_CHUNK_SIZE_MB * 1024 * 1024,
+            worker_type=synchronizer.transfer_manager.THREAD,
+            max_workers=config.PARALLEL_UPLOAD_WORKERS
+        )
+        mock_blob.upload_from_file.assert_not_called()
+
+
+class TestMtimePoller:
+    """Test polling a watched folder for changes by mtime"""
+
+    def dispatched(self, handler):
+        events = [(args[0][0].event_type, args[0][0].src_path) for args in handler.dispatch.call_args_list]
+        handler.dispatch.reset_mock()
+        return sorted(events)
+
+    def test_poll_reports_created_and_modified_files(self, tmp_path):
+        """Test that two polls report new and modified files once, and unchanged files never"""
+        sub_dir = tmp_path / 'sub'
+        sub_dir.mkdir()
+        unchanged, modified = tmp_path / 'unchanged.pdf', sub_dir / 'modified.pdf'
+        unchanged.write_text('old')
+        modified.write_text('old')
+        handler = Mock()
+
+        poller = synchronizer.MtimePoller(str(tmp_path), handler)
+        # Files present at the baseline scan are not reported
+        poller.poll()
+        assert self.dispatched(handler) == []
+
+        created = sub_dir / 'created.pdf'
+        created.write_text('new')
+        mtime_ns = modified.stat().st_mtime_ns
+        os.utime(modified, ns=(mtime_ns + 10**9, mtime_ns + 10**9))
+        poller.poll()
+        assert self.dispatched(handler) == [('created', str(created)), ('modified', str(modified))]
+
+        poller.poll()
+        assert self.dispatched(handler) == []
+
+    def test_poll_rereads_listing_near_directory_mtime(self, tmp_path):
+        """Test that a listing read within the mtime granularity is read again on the next poll"""
+        handler = Mock()
+        poller = synchronizer.MtimePoller(str(tmp_path), handler)
+        dir_mtime_ns = tmp_path.stat().st_mtime_ns
+
+        # A coarse-grained filesystem may leave the directory mtime unchanged
+        created = tmp_path / 'created.pdf'
+        created.write_text('new')
+        os.utime(tmp_path, ns=(dir_mtime_ns, dir_mtime_ns))
+        poller.poll()
+
+        assert self.dispatched(handler) == [('created', str(created))]
+
+    def test_poll_reuses_listing_of_unchanged_directory(self, tmp_path):
+        """Test that a settled directory whose mtime did not change is not listed again"""
+        handler = Mock()
+        with patch('synchronizer.MTIME_GRANULARITY_NS', 0):
+            poller = synchronizer.MtimePoller(str(tmp_path), handler)
+            dir_mtime_ns = tmp_path.stat().st_mtime_ns
+            (tmp_path / 'created.pdf').write_text('new')
+            os.utime(tmp_path, ns=(dir_mtime_ns, dir_mtime_ns))
+            poller.poll()
+
+        assert self.dispatched(handler) == []
+
+
+class TestScheduler:
+    """Test the scheduler's sleep between runs"""
+
+    @pytest.mark.parametrize('idle_seconds, expected', [
+        (7200.5, 7200.5),
+        (0.2, 1),
+        (-30, 1),
+        (None, scheduler.NO_JOB_SLEEP_SECONDS),
+    ])
+    def test_seconds_until_next_run(self, idle_seconds, expected):
+        """Test sleeping until the next job, at least one second, and hourly with no job"""
+        with patch('scheduler.schedule.idle_seconds', return_value=idle_seconds):
+            assert scheduler.seconds_until_next_run() == expected
+
+
+class TestWatcher:
+    """Test the debounced watchdog handler"""
+
+    def wait_for(self, condition, timeout=5):
+        deadline = time.monotonic() + timeout
+        while not condition():
+            assert time.monotonic() < deadline, "timed out waiting for the watcher"
+            time.sleep(0.01)
+
+    def test_watcher_collapses_burst_into_one_write(self, sync_caches, watched_folder):
+        """Test that a burst of events is added to the cache in a single write"""
+        watcher = synchronizer.Watcher(debounce_seconds=0.05)
+        paths = [os.path.join(watched_folder, f'doc_{i}.pdf') for i in range(10)]
+
+        with patch('synchronizer.write_cache', wraps=synchronizer.write_cache) as mock_write:
+            for path in paths + paths[:3]:
+                watcher.dispatch(FileModifiedEvent(path))
+            self.wait_for(lambda: mock_write.called)
+            time.sleep(0.1)
+
+        mock_write.assert_called_once()
+        assert synchronizer.read_cache(sync_caches.update_soon) == sorted(paths)
+
+    def test_watcher_flushes_full_burst_immediately(self, sync_caches, watched_folder):
+        """Test that reaching MAX_PENDING_FILES flushes without waiting for the debounce"""
+        watcher = synchronizer.Watcher(debounce_seconds=60)
+        paths = [os.path.join(watched_folder, f'doc_{i}.pdf') for i in range(3)]
+
+        with patch('synchronizer.MAX_PENDING_FILES', 3):
+            for path in paths[:2]:
+                watcher.dispatch(FileCreatedEvent(path))
+            assert not os.path.exists(sync_caches.update_soon)
+            watcher.dispatch(FileCreatedEvent(paths[2]))
+
+        assert synchronizer.read_cache(sync_caches.update_soon) == paths
+        assert watcher._timer is None
+
+    def test_watcher_stop_flushes_pending_files(self, sync_caches, watched_folder):
+        """Test that stopping the watcher writes the files still waiting for the debounce"""
+        synchronizer.write_cache([os.path.join(watched_folder, 'old.pdf')], sync_caches.update_soon)
+        watcher = synchronizer.Watcher(debounce_seconds=60)
+        path = os.path.join(watched_folder, 'new.pdf')
+        watcher.dispatch(FileCreatedEvent(path))
+
+        watcher.stop()
+
+        assert synchronizer.read_cache(sync_caches.update_soon) == [
+            os.path.join(watched_folder, 'old.pdf'), path
+        ]
+        assert watcher._timer is None
+
+    @pytest.mark.parametrize('relative_path, expected', [
+        ('a.pdf', True),
+        ('sub/Report.PDF', True),
+        ('sub/table.xlsx', True),
+        ('letter.doc', True),
+        ('image.png', False),
+        ('a.pdf.part', False),
+        ('.git/objects/a.pdf', False),
+        ('sub/.a.pdf.swp', False),
+        ('sub/.hidden.pdf', False),
+        ('sub/~$letter.docx', False),
+    ])
+    def test_is_document_path(self, tmp_path, relative_path, expected):
+        """Test that only document files outside hidden directories are synced"""
+        # The watched folder itself may sit below a hidden directory
+        watched = str(tmp_path / '.mnt' / 'documents')
+        path = os.path.join(watched, *relative_path.split('/'))
+
+        with patch('config.WATCHED_FOLDER', watched):
+            assert synchronizer.is_document_path(path) is expected
+
+    def test_watcher_ignores_non_documents(self, sync_caches, watched_folder):
+        """Test that events for other files are dropped before they are queued"""
+        watcher = synchronizer.Watcher(debounce_seconds=60)
+
+        watcher.dispatch(FileCreatedEvent(os.path.join(watched_folder, 'notes.txt')))
+        watcher.dispatch(FileCreatedEvent(os.path.join(watched_folder, '.a.pdf.swp')))
+
+        assert watcher._pending == set()
+        assert watcher._timer is None
 
 
 if __name__ == '__main__':
-    # Create a test suite
-    test_suite = unittest.TestSuite()
-    
-    # Add test classes
-    test_classes = [
-        TestPostgreSQLConnection,
-        TestQueryPostgreSQL,
-        TestGetDocumentsFromPostgreSQL,
-        TestGCSClient,
-        TestUploadToGCS,
-        TestFindLocalFile,
-        TestFilterUnprocessedDocuments,
-        TestProcessingReport,
-        TestMainFunction,
-        TestConfigModule
-    ]
-    
-    for test_class in test_classes:
-        tests = unittest.TestLoader().loadTestsFromTestCase(test_class)
-        test_suite.addTests(tests)
-    
-    # Run tests
-    runner = unittest.TextTestRunner(verbosity=2)
-    result = runner.run(test_suite)
-    
-    # Print summary
-    if result.wasSuccessful():
-        print(f"\n✅ All {result.testsRun} tests passed!")
-    else:
-        print(f"\n❌ {len(result.failures)} failures, {len(result.errors)} errors out of {result.testsRun} tests")
+    raise SystemExit(pytest.main([__file__, '-v']))